@@ -5,23 +5,58 @@ dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir_path, '../../../'))
 
 import random
+import threading
+import numpy as np
 
 import src.robot.ai.minimax as minimax
 import src.robot.ai.monte_carlo as monte_carlo
 import src.robot.ai.alphabeta as alphabeta
 import src.robot.ai.neural_network as neural_network
+from src.robot.ai.transposition_table import TranspositionTable
+from src.robot.ai.move_ordering import MoveOrdering
+from src.robot.ai.parallel_alphabeta import ParallelAlphaBeta
+from src.robot.ai.quiescence import QuiescenceSearch
+import src.robot.ai.evaluation as evaluation
 
 class __AIPlayer(object):
-    def __init__(self, num):
+    # book - OpeningBook looked up before search
+    # tablebase - Tablebase, its best move is played in positions with few
+    # figures
+    def __init__(self, num, book=None, tablebase=None):
         self.__num = num
+        self.__book = book
+        self.__tablebase = tablebase
 
     @property
     def num(self):
         return self.__num
 
+    def book_move(self, checkers):
+        if self.__book is None:
+            return None
+        return self.__book.get_move(checkers)
+
+    def tablebase_move(self, checkers):
+        if self.__tablebase is None:
+            return None
+        return self.__tablebase.best_move(checkers)
+
     def make_move(self, checkers):
         pass
 
+    def start_pondering(self, checkers):
+        # called when opponent is on move, player can search in background,
+        # repeated calls before stop_pondering keep the running search
+        pass
+
+    def stop_pondering(self):
+        pass
+
+    def close(self):
+        # frees worker processes and shared memory of player when its game
+        # ends, player cannot move after it
+        pass
+
 class AIPlayerRandom(__AIPlayer):
     def make_move(self, checkers):
         available_moves = checkers.calc_available_moves_for_player(self.num)
@@ -35,27 +70,150 @@ class AIPlayerRandom(__AIPlayer):
         return 'AIPlayerRandom()'
         
 class AIPlayerAlphaBeta(__AIPlayer):
-    def __init__(self, num, max_depth):
-        super(AIPlayerAlphaBeta, self).__init__(num)
+    # with time_budget in seconds iterative deepening is used and max_depth
+    # is its limit, None for no limit
+    # with processes > 1 root moves are searched by pool of worker processes
+    # quiescence_depth - limit of taking moves searched after max_depth,
+    # None to evaluate positions at max_depth
+    # weights - piece-square weights of evaluation, None for material only
+    # ponder - search answers to opponent moves during opponent's turn, not used
+    # with processes > 1
+    def __init__(self, num, max_depth, table_memory_mb=16, time_budget=None, processes=1,
+                 quiescence_depth=8, weights=evaluation.DEFAULT_WEIGHTS, ponder=True, book=None,
+                 tablebase=None):
+        super(AIPlayerAlphaBeta, self).__init__(num, book, tablebase)
         self.__max_depth = max_depth
+        self.__time_budget = time_budget
+        self.__weights = weights
+        self.__tablebase = tablebase
+        self.__ordering = MoveOrdering()
+        self.__quiescence = None
+        if quiescence_depth is not None:
+            self.__quiescence = QuiescenceSearch(quiescence_depth)
+        # table is kept for whole game, so next searches start with results
+        # of previous ones, workers share table of parallel search
+        self.__table = None
+        self.__parallel = None
+        if processes > 1:
+            self.__parallel = ParallelAlphaBeta(processes, table_memory_mb, quiescence_depth=quiescence_depth,
+                                                weights=weights, tablebase=tablebase)
+        else:
+            self.__table = TranspositionTable(table_memory_mb)
+        self.__ponder = ponder and self.__parallel is None
+        self.__ponder_thread = None
+        self.__ponder_deadline = None
+        self.__ponder_key = None
+        # best moves found while pondering by position key
+        self.__pondered = {}
+
+    @property
+    def pondering(self):
+        return self.__ponder_thread is not None and self.__ponder_thread.is_alive()
+
+    @property
+    def pondered_moves(self):
+        # best moves by position key after opponent move
+        return self.__pondered.copy()
+
+    @property
+    def first_move_cutoff_rate(self):
+        # how often first searched move causes cutoff, measures move ordering
+        return self.__ordering.first_move_cutoff_rate
 
     def make_move(self, checkers):
-        move = alphabeta.get_best_move(checkers, self.__max_depth)
+        self.stop_pondering()
+        move = self.book_move(checkers)
+        if move is None:
+            move = self.tablebase_move(checkers)
+        if move is None:
+            move = self.__pondered.get(checkers.key)
+        self.__pondered = {}
+        self.__ponder_key = None
+
+        if move is None:
+            if self.__parallel is not None:
+                move = self.__parallel.get_best_move(checkers, self.__max_depth, self.__time_budget)
+            else:
+                move = alphabeta.get_best_move(checkers, self.__max_depth, self.__table, self.__time_budget,
+                                               self.__ordering, self.__quiescence, self.__weights,
+                                               tablebase=self.__tablebase)
 
         ret, promoted = checkers.make_move(move)
         
         return move, ret, promoted
 
     def __repr__(self):
+        if self.__time_budget is not None:
+            return f'AIPlayerAlphaBeta(depth={self.__max_depth}, time_budget={self.__time_budget})'
         return f'AIPlayerAlphaBeta(depth={self.__max_depth})'
 
+    def start_pondering(self, checkers):
+        if not self.__ponder or checkers.end or self.__ponder_thread is not None:
+            return
+
+        # results of interrupted pondering of the same position are kept
+        if checkers.key != self.__ponder_key:
+            self.__pondered = {}
+            self.__ponder_key = checkers.key
+
+        # GIL is released every 1000 nodes, so camera thread is not starved
+        self.__ponder_deadline = alphabeta.Deadline(yield_interval=1000)
+        self.__ponder_thread = threading.Thread(target=self.__ponder_moves,
+                                                args=(checkers.copy(), self.__ponder_deadline))
+        self.__ponder_thread.start()
+
+    def stop_pondering(self):
+        if self.__ponder_thread is None:
+            return
+        self.__ponder_deadline.stop()
+        self.__ponder_thread.join()
+        self.__ponder_thread = None
+
+    def close(self):
+        self.stop_pondering()
+        if self.__parallel is not None:
+            self.__parallel.close()
+            self.__parallel = None
+
+    def __ponder_moves(self, checkers, deadline):
+        # opponent move predicted by previous search is the first
+        available_moves = checkers.available_moves
+        order = list(range(len(available_moves)))
+        entry = self.__table.probe(checkers.key)
+        if entry is not None and entry[3] < len(available_moves):
+            order.remove(entry[3])
+            order.insert(0, entry[3])
+
+        for i in order:
+            checkers.push(available_moves[i])
+            if not checkers.end and checkers.key not in self.__pondered:
+                try:
+                    move = alphabeta.get_best_move(checkers, self.__max_depth, self.__table, self.__time_budget,
+                                                   self.__ordering, self.__quiescence, self.__weights, deadline,
+                                                   self.__tablebase)
+                except alphabeta.SearchTimeout:
+                    return
+                if deadline.stopped:
+                    return
+                self.__pondered[checkers.key] = move
+            checkers.pop()
+
 class AIPlayerMinimax(__AIPlayer):
-    def __init__(self, num, max_depth):
-        super(AIPlayerMinimax, self).__init__(num)
+    def __init__(self, num, max_depth, quiescence_depth=8, weights=evaluation.DEFAULT_WEIGHTS, book=None,
+                 tablebase=None):
+        super(AIPlayerMinimax, self).__init__(num, book, tablebase)
         self.__max_depth = max_depth
+        self.__weights = weights
+        self.__quiescence = None
+        if quiescence_depth is not None:
+            self.__quiescence = QuiescenceSearch(quiescence_depth)
 
     def make_move(self, checkers):
-        move = minimax.get_best_move(checkers, self.__max_depth)
+        move = self.book_move(checkers)
+        if move is None:
+            move = self.tablebase_move(checkers)
+        if move is None:
+            move = minimax.get_best_move(checkers, self.__max_depth, self.__quiescence, self.__weights)
 
         ret, promoted = checkers.make_move(move)
         
@@ -65,18 +223,44 @@ class AIPlayerMinimax(__AIPlayer):
         return f'AIPlayerMinimax(depth={self.__max_depth})'
         
 class AIPlayerMonteCarlo(__AIPlayer):
-    def __init__(self, num, simulations):
-        super(AIPlayerMonteCarlo, self).__init__(num)
+    # simulations - playouts of tree search per move, tree is kept between
+    # moves of a game
+    # with processes > 1 playouts are played by pool of worker processes
+    # kept for whole game, seed - seed of their random games
+    # with batch tree is not searched, simulations are playouts of every
+    # available move played at once as arrays, see batch_playout
+    def __init__(self, num, simulations, book=None, tablebase=None, processes=1, seed=None, batch=False):
+        super(AIPlayerMonteCarlo, self).__init__(num, book, tablebase)
         self.__simulations = simulations
+        self.__pool = None
+        self.__batch_rng = None
+        if batch:
+            self.__batch_rng = np.random.default_rng(seed)
+        elif processes > 1:
+            self.__pool = monte_carlo.RolloutPool(processes, seed, tablebase)
+        self.__search = monte_carlo.MonteCarloTreeSearch(simulations, tablebase=tablebase, pool=self.__pool)
 
     def make_move(self, checkers):
-        move = monte_carlo.get_best_move(checkers, self.__simulations)
+        move = self.book_move(checkers)
+        if move is None:
+            move = self.tablebase_move(checkers)
+        if move is None and self.__batch_rng is not None:
+            move = monte_carlo.get_best_move(checkers, self.__simulations, batch_rng=self.__batch_rng)
+        if move is None:
+            move = self.__search.get_best_move(checkers)
         
         ret, promoted = checkers.make_move(move)
         
         return move, ret, promoted
 
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
+
     def __repr__(self):
+        if self.__batch_rng is not None:
+            return f'AIPlayerMonteCarlo(simulations={self.__simulations}, batch=True)'
         return f'AIPlayerMonteCarlo(simulations={self.__simulations})'
 
 class AIPlayerNeuralNetwork(__AIPlayer):
@@ -1,65 +1,281 @@
-from random import choice
+import sys
+import os
 
-def get_best_move(checkers, depth):
-    player_num = checkers.player_turn
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
 
-    root = __Node(None)
+import math
+from random import shuffle
+from time import perf_counter, sleep
 
-    alphabeta(root, checkers, -1e10, 1e10, depth, player_num)
+import src.robot.ai.transposition_table as tt
+import src.robot.ai.evaluation as evaluation
+import src.robot.ai.endgame_tablebase as endgame_tablebase
+from src.robot.ai.move_ordering import MoveOrdering
 
-    scores = [node.score for node in root.next_nodes]
+class SearchTimeout(Exception):
+    pass
 
-    best_moves = []
-    for i in range(len(root.next_nodes)):
-        if scores[i] == max(scores):
-            best_moves.append(root.next_nodes[i].move)
-    
-    return choice(best_moves)
+class Deadline(object):
+    # end of search, perf_counter time or None, search is also ended when
+    # stopped from other thread, background search releases GIL every
+    # yield_interval checks, so other threads are not starved
+    def __init__(self, time=None, yield_interval=None):
+        self.time = time
+        self.__stopped = False
+        self.__yield_interval = yield_interval
+        self.__checks = 0
+
+    @property
+    def stopped(self):
+        return self.__stopped
+
+    def stop(self):
+        self.__stopped = True
+
+    def expired(self):
+        if self.__yield_interval is not None:
+            self.__checks += 1
+            if self.__checks % self.__yield_interval == 0:
+                sleep(0)
+        return self.__stopped or (self.time is not None and perf_counter() > self.time)
+
+class SharedAlpha(object):
+    # lower bound of root player score shared by processes of parallel
+    # search, value - multiprocessing RawValue set by the parent, it is
+    # re-read every interval nodes
+    def __init__(self, value, interval=256):
+        self.__value = value
+        self.__interval = interval
+        self.__checks = 0
+        self.__alpha = -math.inf
+
+    def reset(self):
+        self.__checks = 0
+        self.__alpha = -math.inf
+
+    def raise_alpha(self, alpha):
+        if self.__checks % self.__interval == 0:
+            self.__alpha = self.__value.value
+        self.__checks += 1
+        return max(alpha, self.__alpha)
+
+def get_best_move(checkers, depth, table=None, time_budget=None, ordering=None, quiescence=None,
+                  weights=evaluation.DEFAULT_WEIGHTS, deadline=None, tablebase=None):
+    # table - TranspositionTable kept between moves, scores are stored
+    # relative to player_num, so one table should serve one player
+    # time_budget - seconds for iterative deepening, depth is then the
+    # maximal depth or None for no limit
+    # ordering - MoveOrdering, can be kept between moves for its statistics
+    # quiescence - QuiescenceSearch used at depth 0 instead of evaluation
+    # weights - piece-square weights of evaluation, None for material
+    # deadline - Deadline to stop search from other thread, SearchTimeout is
+    # raised then, with time_budget its time is set by it
+    # tablebase - Tablebase with exact scores of positions with few figures
+    checkers = checkers.copy()
+    checkers.set_weights(weights)
+
+    if ordering is None:
+        ordering = MoveOrdering()
+    ordering.new_search()
+
+    if time_budget is not None:
+        if deadline is None:
+            deadline = Deadline()
+        deadline.time = perf_counter() + time_budget
+        return __get_best_move_iterative(checkers, depth, table, deadline, ordering, quiescence, tablebase)
+
+    if table is not None:
+        table.new_search()
+
+    best_move, _ = __search_root(checkers, depth, table, ordering, quiescence, deadline, tablebase)
+
+    return best_move
+
+def __get_best_move_iterative(checkers, max_depth, table, deadline, ordering, quiescence, tablebase):
+    available_moves = checkers.available_moves
+    if len(available_moves) == 1:
+        return available_moves[0]
+
+    # best moves of previous iteration are kept in table and searched first
+    if table is None:
+        table = tt.TranspositionTable(4)
+    table.new_search()
+
+    # first iteration is always completed, so there is move to return
+    best_move, score = __search_root(checkers, 1, table, ordering, quiescence, None, tablebase)
+
+    # search ends when game is decided, by its end or by tablebase
+    depth = 2
+    while (max_depth is None or depth <= max_depth) and abs(score) < 1e9:
+        try:
+            best_move, score = __search_root(checkers, depth, table, ordering, quiescence, deadline, tablebase)
+        except SearchTimeout:
+            break
+        depth += 1
 
-def alphabeta(node, checkers, alpha, beta, depth, player_num):
+    return best_move
+
+def __search_root(checkers, depth, table, ordering, quiescence, deadline=None, tablebase=None):
+    available_moves = checkers.available_moves
+
+    # first move of order with the best score is chosen, so ties are
+    # broken randomly by shuffled order
+    best_score = -math.inf
+    best_move = None
+    for i in root_order(checkers, table, ordering):
+        score = search_move(checkers, available_moves[i], depth, best_score, table, deadline, ordering,
+                            quiescence, tablebase)
+        if best_move is None or score > best_score:
+            best_score = score
+            best_move = i
+
+    if table is not None:
+        table.store(checkers.key, depth, tt.EXACT, best_score, best_move)
+
+    return available_moves[best_move], best_score
+
+def root_order(checkers, table, ordering):
+    hash_move = tt.NO_MOVE
+    if table is not None:
+        entry = table.probe(checkers.key)
+        if entry is not None:
+            hash_move = entry[3]
+
+    indices = list(range(len(checkers.available_moves)))
+    shuffle(indices)
+
+    return ordering.order(checkers.available_moves, hash_move, checkers.player_turn,
+                          checkers.turn_counter, indices)
+
+def search_move(checkers, move, depth, alpha, table=None, deadline=None, ordering=None, quiescence=None,
+                tablebase=None, shared_alpha=None):
+    # score of root move for player on move, at least alpha
+    # shared_alpha - SharedAlpha raising alpha during search
+    player_num = checkers.player_turn
+    checkers.push(move)
+    try:
+        return alphabeta(checkers, alpha, math.inf, depth - 1, player_num,
+                         table, deadline, ordering, quiescence, tablebase, shared_alpha)
+    finally:
+        checkers.pop()
+
+def alphabeta(checkers, alpha, beta, depth, player_num, table=None, deadline=None, ordering=None,
+              quiescence=None, tablebase=None, shared_alpha=None):
+    # only path from root is kept, so memory depends on depth, not on
+    # number of visited positions
+    if deadline is not None and deadline.expired():
+        raise SearchTimeout()
     if checkers.end:
         if checkers.winner == -1:
             return 0
         return 1e10*(-1, 1)[checkers.winner == player_num]
+    if tablebase is not None:
+        entry = tablebase.probe(checkers)
+        if entry is not None:
+            score = endgame_tablebase.score(*entry)
+            return score if checkers.player_turn == player_num else -score
+    # bound of root move found by other process, it is taken only here, so
+    # stored bounds are relative to alpha the node was searched with
+    if shared_alpha is not None:
+        alpha = shared_alpha.raise_alpha(alpha)
     if depth == 0:
-        return (checkers.board == (2*player_num + 1)).sum()\
-           + 4*(checkers.board == (2*player_num + 2)).sum()\
-           -   (checkers.board == (2*(1 - player_num) + 1)).sum()\
-           - 4*(checkers.board == (2*(1 - player_num) + 1)).sum()
+        if quiescence is not None:
+            return quiescence.search(checkers, alpha, beta, player_num)
+        return evaluation.evaluate(checkers, player_num)
+
+    hash_move = tt.NO_MOVE
+    if table is not None:
+        entry = table.probe(checkers.key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            if entry_depth >= depth:
+                if bound == tt.EXACT:
+                    return score
+                if bound == tt.LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+    alpha_0 = alpha
+    beta_0 = beta
+    best_move = tt.NO_MOVE
+
+    # best move from table, e.g. from previous iteration, is searched first
+    player = checkers.player_turn
+    ply = checkers.turn_counter
+    available_moves = checkers.calc_available_moves_for_player(player)
+    if ordering is not None:
+        order = ordering.order(available_moves, hash_move, player, ply)
+    else:
+        order = range(len(available_moves))
+        if 0 < hash_move < len(available_moves):
+            order = [hash_move] + [i for i in order if i != hash_move]
     
-    if checkers.player_turn == player_num:
+    if player == player_num:
         # maximizing player
         val = -1e10
-        for move in checkers.calc_available_moves_for_player(checkers.player_turn):
-            child_checkers = checkers.copy()
-            child_checkers.make_move(move, False)
-            child_node = __Node(move)
-            node.next_nodes.append(child_node)
-            val = max(val, alphabeta(child_node, child_checkers, alpha, beta, depth - 1, player_num))
+        for searched, i in enumerate(order, 1):
+            move = available_moves[i]
+            checkers.push(move)
+            child_val = alphabeta(checkers, alpha, beta, depth - 1, player_num, table, deadline,
+                                  ordering, quiescence, tablebase, shared_alpha)
+            checkers.pop()
+            if best_move == tt.NO_MOVE or child_val > val:
+                val = child_val
+                best_move = i
             if val >= beta:
+                if ordering is not None:
+                    ordering.cutoff(move, player, ply, depth, searched)
                 break
             alpha = max(alpha, val)
 
-        node.score = val
+        __store(table, checkers.key, depth, alpha_0, beta_0, val, best_move)
         return val
     else:
         # minimizing player
         val = 1e10
-        for move in checkers.calc_available_moves_for_player(checkers.player_turn):
-            child_checkers = checkers.copy()
-            child_checkers.make_move(move, False)
-            child_node = __Node(move)
-            node.next_nodes.append(child_node)
-            val = min(val, alphabeta(child_node, child_checkers, alpha, beta, depth - 1, player_num))
+        for searched, i in enumerate(order, 1):
+            move = available_moves[i]
+            checkers.push(move)
+            child_val = alphabeta(checkers, alpha, beta, depth - 1, player_num, table, deadline,
+                                  ordering, quiescence, tablebase, shared_alpha)
+            checkers.pop()
+            if best_move == tt.NO_MOVE or child_val < val:
+                val = child_val
+                best_move = i
             if val <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(move, player, ply, depth, searched)
                 break
             beta = min(beta, val)
 
-        node.score = val
+        __store(table, checkers.key, depth, alpha_0, beta_0, val, best_move)
         return val
 
-class __Node(object):
-    def __init__(self, move):
-        self.move = move
-        self.score = 0
-        self.next_nodes = []
\ No newline at end of file
+def principal_variation(checkers, table, max_length=32):
+    # best moves stored in table from given position
+    checkers = checkers.copy()
+    variation = []
+    while len(variation) < max_length and not checkers.end:
+        entry = table.probe(checkers.key)
+        if entry is None or entry[3] >= len(checkers.available_moves):
+            break
+        move = checkers.available_moves[entry[3]]
+        variation.append(move)
+        checkers.push(move)
+
+    return variation
+
+def __store(table, key, depth, alpha, beta, val, best_move):
+    if table is None:
+        return
+    if val <= alpha:
+        bound = tt.UPPER
+    elif val >= beta:
+        bound = tt.LOWER
+    else:
+        bound = tt.EXACT
+    table.store(key, depth, bound, val, best_move)
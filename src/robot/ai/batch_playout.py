@@ -0,0 +1,284 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import numpy as np
+
+import src.robot.game_logic.bitboard as bb
+
+# games are played in lockstep: every array holds one value per running game
+# and bitboards of all games are advanced by the same shifts, player on move
+# is the same in all games, so taking chains are finished within their ply
+
+FULL = np.uint64(bb.FULL)
+ONE = np.uint64(1)
+
+def __calc_steps():
+    # SHIFTS of every direction as arrays of two (mask, left, right) steps,
+    # one per row parity, applied as (bb & mask) << left >> right
+    masks = np.zeros((len(bb.DIRECTIONS), 2), dtype=np.uint64)
+    lefts = np.zeros((len(bb.DIRECTIONS), 2), dtype=np.uint64)
+    rights = np.zeros((len(bb.DIRECTIONS), 2), dtype=np.uint64)
+    for d, shifts in enumerate(bb.SHIFTS):
+        for i, (mask, s) in enumerate(shifts):
+            masks[d, i] = mask
+            lefts[d, i] = max(s, 0)
+            rights[d, i] = max(-s, 0)
+    return masks, lefts, rights
+
+STEP_MASKS, STEP_LEFTS, STEP_RIGHTS = __calc_steps()
+
+def __calc_long_steps():
+    # steps over 2 (index 0) and 4 (index 1) squares of every direction, row
+    # parity is the same after them, so one (mask, left, right) is enough
+    masks = np.zeros((2, len(bb.DIRECTIONS)), dtype=np.uint64)
+    lefts = np.zeros((2, len(bb.DIRECTIONS)), dtype=np.uint64)
+    rights = np.zeros((2, len(bb.DIRECTIONS)), dtype=np.uint64)
+    for i, length in enumerate((2, 4)):
+        for d in range(len(bb.DIRECTIONS)):
+            targets = {}
+            for s in range(bb.SQUARES):
+                if len(bb.RAYS[d][s]) >= length:
+                    targets[s] = bb.RAYS[d][s][length - 1]
+            delta, = set(n - s for s, n in targets.items())
+            masks[i, d] = sum(1 << s for s in targets)
+            lefts[i, d] = max(delta, 0)
+            rights[i, d] = max(-delta, 0)
+    return masks, lefts, rights
+
+LONG_STEP_MASKS, LONG_STEP_LEFTS, LONG_STEP_RIGHTS = __calc_long_steps()
+
+# move destinations of every game are kept in 6 bitboards: both pawn
+# directions and all queen directions, CATEGORY_DIRECTIONS[up] - direction of
+# every bitboard of player moving towards row 7 (up) or row 0
+CATEGORY_DIRECTIONS = (np.array(bb.DIRECTIONS_DOWN + tuple(range(len(bb.DIRECTIONS)))),
+                       np.array(bb.DIRECTIONS_UP + tuple(range(len(bb.DIRECTIONS)))))
+
+# all directions as column, bitboards of queens are moved to all of them
+QUEEN_DIRECTIONS = np.arange(len(bb.DIRECTIONS))[:, None]
+
+PROMOTION_ROWS = (np.uint64(bb.PROMOTION_ROWS[0]), np.uint64(bb.PROMOTION_ROWS[1]))
+
+def step(bitboards, d):
+    # bitboards moved one square in direction d, d is scalar or array of
+    # direction of every bitboard, broadcast with them
+    return (bitboards & STEP_MASKS[d, 0]) << STEP_LEFTS[d, 0] >> STEP_RIGHTS[d, 0] |\
+           (bitboards & STEP_MASKS[d, 1]) << STEP_LEFTS[d, 1] >> STEP_RIGHTS[d, 1]
+
+def long_step(bitboards, d, i):
+    # bitboards moved 2 (i = 0) or 4 (i = 1) squares in direction d
+    return (bitboards & LONG_STEP_MASKS[i, d]) << LONG_STEP_LEFTS[i, d] >> LONG_STEP_RIGHTS[i, d]
+
+def fill(generator, empty, d):
+    # generator and empty squares reachable from it in direction d, filled
+    # by 1, 2 and 4 squares, so rays of 7 squares are covered
+    generator = generator | empty & step(generator, d)
+    empty = empty & step(empty, d)
+    generator = generator | empty & long_step(generator, d, 0)
+    empty = empty & long_step(empty, d, 0)
+    return generator | empty & long_step(generator, d, 1)
+
+def popcount(bitboards):
+    bitboards = bitboards - (bitboards >> ONE & np.uint64(0x55555555))
+    bitboards = (bitboards & np.uint64(0x33333333)) + (bitboards >> np.uint64(2) & np.uint64(0x33333333))
+    bitboards = (bitboards + (bitboards >> np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    return (bitboards*np.uint64(0x01010101) & FULL) >> np.uint64(24)
+
+def destinations(own_pawns, own_queens, opponent, empty, up):
+    # (6, N) bitboards of regular moves and of taking moves, see
+    # CATEGORY_DIRECTIONS, taking move is given by square where figure
+    # lands, directions are stacked and moved at once
+    pawn_directions = CATEGORY_DIRECTIONS[up][:2, None]
+    steps = step(own_pawns, pawn_directions)
+    pawn_regular = steps & empty
+    pawn_taking = step(steps & opponent, pawn_directions) & empty
+
+    if not own_queens.any():
+        queen_moves = np.zeros((len(bb.DIRECTIONS), len(own_queens)), dtype=np.uint64)
+        return np.concatenate((pawn_regular, queen_moves)), np.concatenate((pawn_taking, queen_moves))
+
+    # empty squares of ray, then opponent figure with empty squares behind
+    # it, queen can land on every one of them
+    queen_rays = fill(own_queens, empty, QUEEN_DIRECTIONS)
+    reach = queen_rays & empty
+    landing = fill(step(step(queen_rays, QUEEN_DIRECTIONS) & opponent, QUEEN_DIRECTIONS) & empty, empty,
+                   QUEEN_DIRECTIONS)
+
+    return np.concatenate((pawn_regular, reach)), np.concatenate((pawn_taking, landing))
+
+def choose(moves, rng):
+    # random move of every game as (category, destination bit), every game
+    # has at least one move
+    counts = popcount(moves).astype(np.int64)
+    bounds = np.cumsum(counts, axis=0)
+    r = (rng.random(moves.shape[1])*bounds[-1]).astype(np.int64)
+    category = (bounds <= r).sum(axis=0)
+    games = np.arange(moves.shape[1])
+    r -= bounds[category, games] - counts[category, games]
+
+    # r lowest bits are cleared
+    bits = moves[category, games]
+    while True:
+        skip = r > 0
+        if not skip.any():
+            break
+        bits = np.where(skip, bits & (bits - ONE), bits)
+        r -= skip
+    return category, bits & (~bits + ONE)
+
+def source(dest, d, own, empty, opponent):
+    # figure moved to dest in direction d and figure taken by it, found on
+    # the way back over empty squares, taken figure and empty squares
+    back = 3 - d
+    behind = step(fill(dest, empty, back), back)
+    taken = behind & opponent
+    src = behind & own | step(fill(taken, empty, back), back) & own
+    return src, taken
+
+def playouts(pawns, queens, player, robot_color, no_taking_queen_moves, rng):
+    # pawns, queens - (2, N) bitboards of N games indexed by player
+    # player - player on move in all games
+    # no_taking_queen_moves - (2, N) queen moves without taking, game is
+    # drawn when both exceed 15
+    # rng - numpy random Generator
+    # returns (N,) winners of games, -1 for draw
+    pawns = np.array(pawns, dtype=np.uint64)
+    queens = np.array(queens, dtype=np.uint64)
+    counters = np.array(no_taking_queen_moves, dtype=np.int64)
+    results = np.full(pawns.shape[1], -1, dtype=np.int8)
+    games = np.arange(pawns.shape[1])
+
+    while len(games) > 0:
+        lost, drawn = ply(pawns, queens, counters, player, robot_color, rng)
+        results[games[lost]] = 1 - player
+        running = ~(lost | drawn)
+        if not running.all():
+            games = games[running]
+            pawns = pawns[:, running]
+            queens = queens[:, running]
+            counters = counters[:, running]
+
+        player = 1 - player
+
+    return results
+
+def ply(pawns, queens, counters, player, robot_color, rng):
+    # random move of player in every game, (2, N) arrays of playouts are
+    # changed in place, returns (N,) masks of games lost by player without
+    # moves, which are not changed, and of games drawn by the move
+    opponent = 1 - player
+    up = int(player == robot_color)
+    directions = CATEGORY_DIRECTIONS[up]
+    own_pawns = pawns[player]
+    own_queens = queens[player]
+    opponent_figures = pawns[opponent] | queens[opponent]
+    empty = ~(own_pawns | own_queens | opponent_figures) & FULL
+
+    regular, taking = destinations(own_pawns, own_queens, opponent_figures, empty, up)
+    is_taking = taking.any(axis=0)
+    moves = np.where(is_taking, taking, regular)
+
+    # game without moves is lost
+    lost = ~moves.any(axis=0)
+    drawn = np.zeros_like(lost)
+    if lost.all():
+        return lost, drawn
+    # games with moves, views of arrays when all games are played
+    played = np.flatnonzero(~lost) if lost.any() else slice(None)
+    game_pawns = pawns[:, played]
+    game_queens = queens[:, played]
+    game_counters = counters[:, played]
+    own_pawns = own_pawns[played]
+    own_queens = own_queens[played]
+    opponent_figures = opponent_figures[played]
+    empty = empty[played]
+    is_taking = is_taking[played]
+    moves = moves[:, played]
+
+    category, dest = choose(moves, rng)
+    src, taken = source(dest, directions[category], own_pawns | own_queens, empty,
+                        np.where(is_taking, opponent_figures, 0))
+    is_queen = (own_queens & src) != 0
+    game_pawns[player] ^= np.where(is_queen, 0, src | dest)
+    game_queens[player] ^= np.where(is_queen, src | dest, 0)
+    empty = (empty | src) & ~dest
+
+    # chain continues from landing square, taken figures stay on board
+    # until its end, for pawn they block squares and for queen they are
+    # empty as in Checkers
+    chain = np.flatnonzero(is_taking)
+    while len(chain) > 0:
+        chain_dest = dest[chain]
+        chain_queen = is_queen[chain]
+        chain_taken = taken[chain]
+        chain_opponent = opponent_figures[chain] & ~chain_taken
+        chain_empty = empty[chain] | np.where(chain_queen, chain_taken, 0)
+
+        _, chain_moves = destinations(np.where(chain_queen, 0, chain_dest),
+                                      np.where(chain_queen, chain_dest, 0),
+                                      chain_opponent, chain_empty, up)
+        continuing = chain_moves.any(axis=0)
+        chain = chain[continuing]
+        if len(chain) == 0:
+            break
+        chain_moves = chain_moves[:, continuing]
+        chain_dest = chain_dest[continuing]
+        chain_queen = chain_queen[continuing]
+        chain_opponent = chain_opponent[continuing]
+        chain_empty = chain_empty[continuing]
+
+        category, next_dest = choose(chain_moves, rng)
+        _, next_taken = source(next_dest, directions[category], chain_dest, chain_empty, chain_opponent)
+        moved = chain_dest | next_dest
+        game_pawns[player, chain] ^= np.where(chain_queen, 0, moved)
+        game_queens[player, chain] ^= np.where(chain_queen, moved, 0)
+        empty[chain] = (empty[chain] | chain_dest) & ~next_dest
+        dest[chain] = next_dest
+        taken[chain] |= next_taken
+
+    game_pawns[opponent] &= ~taken
+    game_queens[opponent] &= ~taken
+    promoted = ~is_queen & (dest & PROMOTION_ROWS[up] != 0)
+    game_pawns[player] ^= np.where(promoted, dest, 0)
+    game_queens[player] |= np.where(promoted, dest, 0)
+
+    game_counters[player] = np.where(is_taking, 0, game_counters[player] + is_queen)
+    drawn[played] = (game_counters > 15).all(axis=0)
+
+    if lost.any():
+        pawns[:, played] = game_pawns
+        queens[:, played] = game_queens
+        counters[:, played] = game_counters
+    return lost, drawn
+
+def root_move_counts(checkers, games, rng):
+    # (wins of player 0, wins of player 1, draws) of random games after
+    # every available move of position, all games are played at once
+    available_moves = checkers.available_moves
+    child = checkers.copy()
+
+    counts = [None]*len(available_moves)
+    played = []
+    children = []
+    for i, move in enumerate(available_moves):
+        child.push(move)
+        if child.end:
+            counts[i] = tuple(games if result == child.winner else 0 for result in (0, 1, -1))
+        else:
+            pawns, queens = child.bitboards()
+            played.append(i)
+            children.append((pawns, queens, [15 - moves for moves in child.queens_moves_to_draw]))
+        child.pop()
+
+    if len(played) > 0:
+        # position of every played move is repeated for its games
+        pawns, queens, no_taking_queen_moves = (np.repeat(np.array(arrays, dtype=np.int64).T, games, axis=1)
+                                                for arrays in zip(*children))
+        results = playouts(pawns, queens, 1 - checkers.player_turn, checkers.robot_color, no_taking_queen_moves,
+                           rng).reshape(len(played), games)
+        for i, move_results in zip(played, results):
+            counts[i] = tuple(int(np.count_nonzero(move_results == result)) for result in (0, 1, -1))
+
+    return counts
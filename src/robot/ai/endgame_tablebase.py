@@ -0,0 +1,383 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import itertools
+import multiprocessing
+import numpy as np
+from math import comb
+
+import src.robot.game_logic.bitboard as bb
+import src.robot.game_logic.serialization as serialization
+import src.robot.ai.pool_worker as pool_worker
+
+TABLEBASE_MAGIC = b'CKT'
+
+# results of side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# value of position is result*(distance + 1), where distance is number of
+# plies to the end of game with the best play, 0 is draw
+VALUE_DTYPE = np.dtype('<i2')
+
+# positions are seen by side to move, its pawns move towards row 7, side
+# moving towards row 0 has board rotated by 180 degrees
+OWN_PAWN_SQUARES = bb.FULL >> 4
+OPPONENT_PAWN_SQUARES = bb.FULL & ~0b1111
+
+# number of positions generated by one task of worker process
+CHUNK_SIZE = 4096
+
+def rotate(bitboard):
+    # 180 degrees rotation maps square s to 31 - s
+    return int(f'{bitboard:032b}'[::-1], 2)
+
+def signature(own_pawns, own_queens, opponent_pawns, opponent_queens):
+    # numbers of figures of table of given bitboards
+    return (bin(own_pawns).count('1'), bin(own_queens).count('1'),
+            bin(opponent_pawns).count('1'), bin(opponent_queens).count('1'))
+
+def opponent_signature(signature):
+    return signature[2:] + signature[:2]
+
+def signatures(max_pieces):
+    # tables with at most max_pieces figures, every table comes after
+    # tables of its takings and promotions
+    result = []
+    for pieces in range(2, max_pieces + 1):
+        for own in range(1, pieces):
+            for own_pawns in range(own + 1):
+                for opponent_pawns in range(pieces - own + 1):
+                    result.append((own_pawns, own - own_pawns, opponent_pawns, pieces - own - opponent_pawns))
+    return sorted(result, key=lambda s: (sum(s), s[0] + s[2]))
+
+def file_name(signature):
+    return 'tablebase_{}{}{}{}.bin'.format(*signature)
+
+def within_draw_rule(distance, moves_to_draw):
+    # game ends in distance plies before 15 queen moves draw, moves_to_draw
+    # - queen moves without taking left to side to move and to opponent, side
+    # that cannot make more of them in distance plies prevents the draw
+    return (distance + 1)//2 <= moves_to_draw[0] or distance//2 <= moves_to_draw[1]
+
+def score(result, distance):
+    # search score of side to move, shorter wins and longer losses are
+    # better, all are above 1e9 like won and lost game ends
+    return result*(1e10 - distance)
+
+def colex_rank(compressed):
+    # rank of sorted combination in colexicographic order
+    return sum(comb(c, i) for i, c in enumerate(compressed, 1))
+
+def colex_unrank(rank, k):
+    compressed = []
+    for i in range(k, 0, -1):
+        c = i - 1
+        while comb(c + 1, i) <= rank:
+            c += 1
+        rank -= comb(c, i)
+        compressed.append(c)
+    return compressed[::-1]
+
+def free_rank(squares, occupied, allowed):
+    # squares numbered among allowed squares that are not occupied
+    ranks = []
+    for s in squares:
+        below = (1 << s) - 1
+        ranks.append(bin(allowed & ~occupied & below).count('1'))
+    return ranks
+
+class TableIndex(object):
+    # perfect index of figure placements of one signature: own pawns are
+    # ranked among squares before row 7, opponent pawns among squares after
+    # row 0 not taken by own pawns, then own queens and opponent queens
+    # among remaining squares. Number of opponent pawn placements depends on
+    # own pawns, so their offsets are kept for every own pawn placement.
+    def __init__(self, signature):
+        self.__signature = signature
+        own_pawns, own_queens, opponent_pawns, opponent_queens = signature
+
+        free = bb.SQUARES - own_pawns - opponent_pawns
+        self.__opponent_queen_placements = comb(free - own_queens, opponent_queens)
+        self.__queen_placements = comb(free, own_queens)*self.__opponent_queen_placements
+
+        placements = comb(bin(OWN_PAWN_SQUARES).count('1'), own_pawns)
+        self.__offsets = np.zeros(placements + 1, dtype=np.int64)
+        for squares in itertools.combinations(range(bb.SQUARES), own_pawns):
+            pawns = sum(1 << s for s in squares)
+            if pawns & ~OWN_PAWN_SQUARES:
+                continue
+            opponent_squares = bin(OPPONENT_PAWN_SQUARES & ~pawns).count('1')
+            self.__offsets[colex_rank(free_rank(squares, 0, OWN_PAWN_SQUARES)) + 1] =\
+                comb(opponent_squares, opponent_pawns)*self.__queen_placements
+        self.__offsets = np.cumsum(self.__offsets)
+
+    @property
+    def signature(self):
+        return self.__signature
+
+    @property
+    def size(self):
+        return int(self.__offsets[-1])
+
+    def index(self, own_pawns, own_queens, opponent_pawns, opponent_queens):
+        pawns = own_pawns | opponent_pawns
+
+        i = int(self.__offsets[colex_rank(free_rank(bb.squares(own_pawns), 0, OWN_PAWN_SQUARES))])
+        i += colex_rank(free_rank(bb.squares(opponent_pawns), own_pawns, OPPONENT_PAWN_SQUARES))*\
+             self.__queen_placements
+        i += colex_rank(free_rank(bb.squares(own_queens), pawns, bb.FULL))*self.__opponent_queen_placements
+        i += colex_rank(free_rank(bb.squares(opponent_queens), pawns | own_queens, bb.FULL))
+
+        return i
+
+    def placement(self, i):
+        # bitboards of own pawns, own queens, opponent pawns, opponent queens
+        own_pawns, own_queens, opponent_pawns, opponent_queens = self.__signature
+
+        own_pawn_rank = int(np.searchsorted(self.__offsets, i, 'right')) - 1
+        i -= int(self.__offsets[own_pawn_rank])
+        opponent_pawn_rank, i = divmod(i, self.__queen_placements)
+        own_queen_rank, opponent_queen_rank = divmod(i, self.__opponent_queen_placements)
+
+        occupied = 0
+        bitboards = []
+        for rank, k, allowed in ((own_pawn_rank, own_pawns, OWN_PAWN_SQUARES),
+                                 (opponent_pawn_rank, opponent_pawns, OPPONENT_PAWN_SQUARES),
+                                 (own_queen_rank, own_queens, bb.FULL),
+                                 (opponent_queen_rank, opponent_queens, bb.FULL)):
+            free = [s for s in range(bb.SQUARES) if (allowed & ~occupied) >> s & 1]
+            bitboard = sum(1 << free[c] for c in colex_unrank(rank, k))
+            occupied |= bitboard
+            bitboards.append(bitboard)
+
+        return bitboards[0], bitboards[2], bitboards[1], bitboards[3]
+
+class Tablebase(object):
+    # tables of all signatures in directory, memory-mapped, so probes read
+    # only pages they need
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__tables = {}
+        self.__max_pieces = 0
+
+        for name in os.listdir(directory):
+            if not (name.startswith('tablebase_') and name.endswith('.bin')):
+                continue
+            table_signature = tuple(int(c) for c in name[len('tablebase_'):-len('.bin')])
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as file:
+                serialization.check_header(file.read(serialization.HEADER_SIZE), TABLEBASE_MAGIC)
+            values = np.memmap(path, dtype=VALUE_DTYPE, mode='r', offset=serialization.HEADER_SIZE)
+            self.__tables[table_signature] = (TableIndex(table_signature), values)
+            self.__max_pieces = max(self.__max_pieces, sum(table_signature))
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def max_pieces(self):
+        return self.__max_pieces
+
+    def value(self, own_pawns, own_queens, opponent_pawns, opponent_queens):
+        # value of position seen by side to move or None without its table
+        table = self.__tables.get(signature(own_pawns, own_queens, opponent_pawns, opponent_queens))
+        if table is None:
+            return None
+        index, values = table
+        return int(values[index.index(own_pawns, own_queens, opponent_pawns, opponent_queens)])
+
+    def probe(self, checkers, draw_rule=True):
+        # (result, distance) of side to move or None, with draw_rule also
+        # when win or loss could be turned into draw by 15 queen moves rule
+        pawns, queens = checkers.bitboards()
+        if bin(pawns[0] | pawns[1] | queens[0] | queens[1]).count('1') > self.__max_pieces:
+            return None
+
+        player = checkers.player_turn
+        moves_to_draw = None
+        if draw_rule:
+            moves_to_draw = checkers.queens_moves_to_draw
+            moves_to_draw = (moves_to_draw[player], moves_to_draw[1 - player])
+        return self.probe_bitboards(pawns, queens, player, checkers.robot_color, moves_to_draw)
+
+    def probe_bitboards(self, pawns, queens, player, robot_color, moves_to_draw=None):
+        # probe of position given by bitboards indexed by player
+        # moves_to_draw - see within_draw_rule, results which can be
+        # turned into draw are None, with None every result is given
+        opponent = 1 - player
+        bitboards = (pawns[player], queens[player], pawns[opponent], queens[opponent])
+        if player != robot_color:
+            bitboards = tuple(rotate(bitboard) for bitboard in bitboards)
+
+        value = self.value(*bitboards)
+        if value is None:
+            return None
+        if value == 0:
+            return DRAW, 0
+        distance = abs(value) - 1
+        if moves_to_draw is not None and not within_draw_rule(distance, moves_to_draw):
+            return None
+        return (WIN if value > 0 else LOSS), distance
+
+    def best_move(self, checkers):
+        # move with the best result and distance or None if position or any
+        # of its successors is not in tables, or result of position is not
+        # exact, then the best line of successor fits in 15 queen moves rule
+        if self.probe(checkers) is None:
+            return None
+
+        best_move = None
+        best_score = None
+        for move in checkers.available_moves:
+            checkers.push(move)
+            if checkers.end:
+                move_score = 0 if checkers.winner == -1 else score(WIN, 1)
+            else:
+                entry = self.probe(checkers, False)
+                move_score = None if entry is None else -score(*entry)
+            checkers.pop()
+            if move_score is None:
+                return None
+            if best_move is None or move_score > best_score:
+                best_move = move
+                best_score = move_score
+
+        return best_move
+
+def init_worker(directory):
+    # tables generated before current one, see pool_worker
+    pool_worker.init(tablebase=Tablebase(directory))
+
+def successors_task(group, start, end):
+    # successors of positions [start, end) of tables of group signatures, which
+    # are indexed one after another, as arrays of position, successor index
+    # in these tables or -1 and value of successor from other table
+    indices = [TableIndex(group_signature) for group_signature in group]
+    offsets = np.cumsum([0] + [index.size for index in indices])
+
+    positions = []
+    successors = []
+    values = []
+    for i in range(start, end):
+        table = int(np.searchsorted(offsets, i, 'right')) - 1
+        own_pawns, own_queens, opponent_pawns, opponent_queens = indices[table].placement(i - int(offsets[table]))
+
+        for code in bb.calc_available_moves((own_pawns, opponent_pawns), (own_queens, opponent_queens), 0, 0):
+            src = 1 << bb.move_src(code)
+            dest = 1 << bb.move_dest(code)
+            taken = ~bb.move_taken_mask(code)
+
+            new_pawns = own_pawns
+            new_queens = own_queens
+            if own_pawns & src:
+                new_pawns ^= src
+                if code & bb.PROMOTED:
+                    new_queens |= dest
+                else:
+                    new_pawns |= dest
+            else:
+                new_queens = new_queens ^ src | dest
+
+            # successor is seen by opponent
+            successor = (rotate(opponent_pawns & taken), rotate(opponent_queens & taken),
+                         rotate(new_pawns), rotate(new_queens))
+            positions.append(i)
+            if successor[0] | successor[1] == 0:
+                # opponent has no figures and lost
+                successors.append(-1)
+                values.append(LOSS)
+                continue
+
+            successor_signature = signature(*successor)
+            if successor_signature in group:
+                table = group.index(successor_signature)
+                successors.append(int(offsets[table]) + indices[table].index(*successor))
+                values.append(0)
+            else:
+                successors.append(-1)
+                values.append(pool_worker.state['tablebase'].value(*successor))
+
+    return (np.array(positions, dtype=np.int64), np.array(successors, dtype=np.int64),
+            np.array(values, dtype=VALUE_DTYPE))
+
+def generate(directory, max_pieces=4, processes=4):
+    # retrograde analysis of all tables with at most max_pieces figures,
+    # tables are generated from the smallest, together with table of
+    # opponent signature, as their positions lead to each other
+    # 15 moves draw rule is not part of tables, so long wins can be draws,
+    # probes check it with within_draw_rule
+    os.makedirs(directory, exist_ok=True)
+
+    done = set()
+    for table_signature in signatures(max_pieces):
+        if table_signature in done:
+            continue
+        group = [table_signature]
+        if opponent_signature(table_signature) != table_signature:
+            group.append(opponent_signature(table_signature))
+
+        values = __solve(directory, group, processes)
+
+        offset = 0
+        for group_signature in group:
+            size = TableIndex(group_signature).size
+            with open(os.path.join(directory, file_name(group_signature)), 'wb') as file:
+                file.write(serialization.header(TABLEBASE_MAGIC))
+                file.write(values[offset:offset + size].astype(VALUE_DTYPE).tobytes())
+            offset += size
+            done.add(group_signature)
+
+    return sorted(done, key=lambda s: (sum(s), s[0] + s[2]))
+
+def __solve(directory, group, processes):
+    size = sum(TableIndex(group_signature).size for group_signature in group)
+
+    # moves are generated by worker processes, tables generated before are
+    # read from directory
+    with multiprocessing.Pool(processes, init_worker, (directory,)) as pool:
+        chunks = pool.starmap(successors_task, [(group, start, min(start + CHUNK_SIZE, size))
+                                                for start in range(0, size, CHUNK_SIZE)])
+    positions = np.concatenate([chunk[0] for chunk in chunks])
+    successors = np.concatenate([chunk[1] for chunk in chunks])
+    successor_values = np.concatenate([chunk[2] for chunk in chunks]).astype(np.int32)
+
+    # positions without moves are lost, successors of the others are
+    # grouped by position, as generated
+    values = np.zeros(size, dtype=np.int32)
+    has_moves = np.zeros(size, dtype=bool)
+    has_moves[positions] = True
+    values[~has_moves] = LOSS
+    moving, starts = np.unique(positions, return_index=True)
+
+    internal = successors >= 0
+    max_distance = int(np.abs(successor_values).max(initial=0))
+
+    # position is won in d plies if successor is lost in d - 1 plies and
+    # lost if all successors are won and the longest win takes d - 1 plies
+    d = 1
+    changed = True
+    while changed or d <= max_distance:
+        current = np.where(internal, values[np.maximum(successors, 0)], successor_values)
+        unknown = values[moving] == 0
+        won = np.maximum.reduceat(current == -d, starts) & unknown
+        lost = (np.minimum.reduceat(current, starts) > 0) & (np.maximum.reduceat(current, starts) == d) & unknown
+        values[moving[won]] = d + 1
+        values[moving[lost]] = -(d + 1)
+        changed = bool(won.any() or lost.any())
+        d += 1
+
+    return values
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.path.join(dir_path, 'tablebases')
+    max_pieces = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    for table_signature in generate(directory, max_pieces, processes):
+        print(f'{file_name(table_signature)}: {TableIndex(table_signature).size} positions')
@@ -0,0 +1,71 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import numpy as np
+
+import src.robot.game_logic.bitboard as bb
+
+def material(checkers, player_num):
+    # pawns are worth 1, queens 4, relative to player_num
+    board = checkers.board
+    return int((board == (2*player_num + 1)).sum()
+               + 4*(board == (2*player_num + 2)).sum()
+               -   (board == (2*(1 - player_num) + 1)).sum()
+               - 4*(board == (2*(1 - player_num) + 2)).sum())
+
+def evaluate(checkers, player_num):
+    # piece-square score kept by checkers or material if it has no weights
+    if checkers.weights is None:
+        return material(checkers, player_num)
+    return checkers.evaluation(player_num)
+
+class PieceSquareWeights(object):
+    # values of pawn and queen on every square, (8, 8) arrays indexed [x, y]
+    # for player moving towards row 7, values of player moving towards row 0
+    # are the same with board rotated by 180 degrees
+    def __init__(self, pawn, queen):
+        self.__pawn = np.array(pawn, dtype=float)
+        self.__queen = np.array(queen, dtype=float)
+        self.__tables = {}
+
+    @property
+    def pawn(self):
+        return self.__pawn.copy()
+
+    @property
+    def queen(self):
+        return self.__queen.copy()
+
+    def tables(self, robot_color):
+        # tables indexed [figure][(x, y)] with values of player 0 figures
+        # positive and of player 1 figures negative
+        if robot_color not in self.__tables:
+            tables = [{pos: 0.0 for pos in bb.SQUARE_POS}]
+            for figure in range(1, 5):
+                player = (figure - 1)//2
+                values = self.__pawn if figure % 2 == 1 else self.__queen
+                if player != robot_color:
+                    values = values[::-1, ::-1]
+                sign = 1 - 2*player
+                tables.append({pos: sign*float(values[pos]) for pos in bb.SQUARE_POS})
+            self.__tables[robot_color] = tuple(tables)
+        return self.__tables[robot_color]
+
+def __default_weights():
+    # material as in material evaluation, pawns gain with advancement and
+    # back row pawns guard promotion row, queens prefer long diagonals
+    pawn = np.ones((8, 8))
+    for y in range(8):
+        pawn[:, y] += 0.05*y
+    pawn[:, 0] += 0.1
+
+    queen = np.full((8, 8), 4.0)
+    for x in range(8):
+        queen[x, 7 - x] += 0.1
+
+    return PieceSquareWeights(pawn, queen)
+
+DEFAULT_WEIGHTS = __default_weights()
@@ -1,59 +1,60 @@
-from random import choice
+import sys
+import os
 
-def get_best_move(checkers, depth):
-    player_num = checkers.player_turn
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
 
-    root = __Node(None)
+from random import choice
 
-    minimax(root, checkers, depth, player_num)
+import src.robot.ai.evaluation as evaluation
 
-    scores = [node.score for node in root.next_nodes]
+def get_best_move(checkers, depth, quiescence=None, weights=evaluation.DEFAULT_WEIGHTS):
+    # quiescence - QuiescenceSearch used at depth 0 instead of evaluation
+    # weights - piece-square weights of evaluation, None for material
+    # only scores of root moves are kept
+    checkers = checkers.copy()
+    checkers.set_weights(weights)
+    player_num = checkers.player_turn
 
+    best_score = None
     best_moves = []
-    for i in range(len(root.next_nodes)):
-        if scores[i] == max(scores):
-            best_moves.append(root.next_nodes[i].move)
+    for move in checkers.available_moves:
+        checkers.push(move)
+        score = minimax(checkers, depth - 1, player_num, quiescence)
+        checkers.pop()
+        if best_score is None or score > best_score:
+            best_score = score
+            best_moves = [move]
+        elif score == best_score:
+            best_moves.append(move)
     
     return choice(best_moves)
 
-def minimax(node, checkers, depth, player_num):
+def minimax(checkers, depth, player_num, quiescence=None):
     if checkers.end:
         if checkers.winner == -1:
             return 0
         return 1e10*(-1, 1)[checkers.winner == player_num]
     if depth == 0:
-        return (checkers.board == (2*player_num + 1)).sum()\
-           + 4*(checkers.board == (2*player_num + 2)).sum()\
-           -   (checkers.board == (2*(1 - player_num) + 1)).sum()\
-           - 4*(checkers.board == (2*(1 - player_num) + 1)).sum()
+        if quiescence is not None:
+            return quiescence.search(checkers, -1e10, 1e10, player_num)
+        return evaluation.evaluate(checkers, player_num)
     
     if checkers.player_turn == player_num:
         # maximizing player
         val = -1e10
         for move in checkers.calc_available_moves_for_player(checkers.player_turn):
-            child_checkers = checkers.copy()
-            child_checkers.make_move(move, False)
-            child_node = __Node(move)
-            node.next_nodes.append(child_node)
-            val = max(val, minimax(child_node, child_checkers, depth - 1, player_num))
+            checkers.push(move)
+            val = max(val, minimax(checkers, depth - 1, player_num, quiescence))
+            checkers.pop()
 
-        node.score = val
         return val
     else:
         # minimizing player
         val = 1e10
         for move in checkers.calc_available_moves_for_player(checkers.player_turn):
-            child_checkers = checkers.copy()
-            child_checkers.make_move(move, False)
-            child_node = __Node(move)
-            node.next_nodes.append(child_node)
-            val = min(val, minimax(child_node, child_checkers, depth - 1, player_num))
+            checkers.push(move)
+            val = min(val, minimax(checkers, depth - 1, player_num, quiescence))
+            checkers.pop()
 
-        node.score = val
         return val
-
-class __Node(object):
-    def __init__(self, move):
-        self.move = move
-        self.score = 0
-        self.next_nodes = []
\ No newline at end of file
@@ -4,35 +4,473 @@ import os
 dir_path = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(dir_path, '../../../'))
 
-import src.robot.ai.ai_player as ai_player
+import math
+import multiprocessing
+import random
+import numpy as np
 
-def get_best_move(checkers, simulations):
+import src.robot.game_logic.bitboard as bb
+import src.robot.ai.batch_playout as batch_playout
+import src.robot.ai.pool_worker as pool_worker
+from src.robot.ai.endgame_tablebase import Tablebase
+from src.robot.game_logic.checkers import Checkers, Move
+
+# nodes of arena allocated at start, it grows twice when full
+INITIAL_NODES = 1024
+
+# leaves of tree search played out by every worker at once
+LEAVES_PER_WORKER = 8
+
+# masks and shifts of two steps of both pawn directions of player moving
+# towards row 0 (index 0) and row 7 (index 1) as flat tuples, see
+# bitboard.PAWN_STEPS
+PAWN_STEPS = tuple(steps[0][0] + steps[0][1] + steps[1][0] + steps[1][1] for steps in bb.PAWN_STEPS)
+
+def get_best_move(checkers, simulations, tablebase=None, pool=None, batch_rng=None):
+    # tablebase - Tablebase, simulation ends with its result when it reaches
+    # position with few figures
+    # pool - RolloutPool playing simulations in worker processes
+    # batch_rng - numpy random Generator, with it simulations of all moves
+    # are played at once by batch_playout, tablebase is not used then
     player_num = checkers.player_turn
+    available_moves = checkers.available_moves
+
+    if batch_rng is not None:
+        counts = batch_playout.root_move_counts(checkers, simulations, batch_rng)
+    elif pool is not None:
+        counts = pool.rollouts(checkers, [([move.code], simulations) for move in available_moves])
+    else:
+        root_checkers = checkers.copy()
+        counts = []
+        for move in available_moves:
+            root_checkers.push(move)
+            counts.append(rollouts(root_checkers, simulations, random, tablebase))
+            root_checkers.pop()
+
+    move_score = [5*move_counts[player_num] + move_counts[2] for move_counts in counts]
+
+    return available_moves[move_score.index(max(move_score))]
+
+def playout(checkers, rng=random, tablebase=None):
+    # winner of random game from position, or of tablebase result, game is
+    # played on bitboards of position without Checkers and moves are not
+    # validated. Regular pawn moves are counted by destination bitboards and
+    # only the drawn one is decoded, regular queen moves are kept as
+    # (source, destination) bits, only positions with taking moves use move
+    # codes.
+    if checkers.end:
+        return checkers.winner
+
+    pawns, queens = checkers.bitboards()
+    player = checkers.player_turn
+    robot_color = checkers.robot_color
+    no_taking_queen_moves = [15 - moves for moves in checkers.queens_moves_to_draw]
+    max_pieces = tablebase.max_pieces if tablebase is not None else -1
+    random_float = rng.random
+    rays = bb.SQUARE_RAY_BITS
+    full = bb.FULL
+    pawn_directions = (bb.DIRECTIONS_DOWN, bb.DIRECTIONS_UP)
+    promotion_rows = bb.PROMOTION_ROWS
+    calc_taking_moves = bb.calc_taking_moves
+    queen_moves = []
+
+    while True:
+        if max_pieces >= 0 and\
+           bin(pawns[0] | pawns[1] | queens[0] | queens[1]).count('1') <= max_pieces:
+            entry = tablebase.probe_bitboards(pawns, queens, player, robot_color,
+                                              (15 - no_taking_queen_moves[player],
+                                               15 - no_taking_queen_moves[1 - player]))
+            if entry is not None:
+                # indexed by draw, win and loss of player on move
+                return (-1, player, 1 - player)[entry[0]]
+
+        opponent = 1 - player
+        own_pawns = pawns[player]
+        own_queens = queens[player]
+        opponent_figures = pawns[opponent] | queens[opponent]
+        empty = full & ~(own_pawns | own_queens | opponent_figures)
+        up = player == robot_color
+
+        taking = False
+        if own_pawns:
+            a_mask_1, a_left_1, a_right_1, a_mask_2, a_left_2, a_right_2,\
+                b_mask_1, b_left_1, b_right_1, b_mask_2, b_left_2, b_right_2 = PAWN_STEPS[up]
+            jumps = bb.PAWN_JUMPS[up]
+
+            # one step of pawns in both directions gives regular moves and
+            # opponent figures next to pawns, they are taken when the next
+            # step from them is empty
+            a_steps = (own_pawns & a_mask_1) << a_left_1 >> a_right_1 | (own_pawns & a_mask_2) << a_left_2 >> a_right_2
+            b_steps = (own_pawns & b_mask_1) << b_left_1 >> b_right_1 | (own_pawns & b_mask_2) << b_left_2 >> b_right_2
+            a_hits = a_steps & opponent_figures
+            b_hits = b_steps & opponent_figures
+            jumping = 0
+            if a_hits:
+                a_mask, a_left, a_right = jumps[0]
+                jumping = own_pawns & a_mask & (empty << a_right) >> a_left &\
+                    (a_hits << a_right_1 >> a_left_1 & a_mask_1 | a_hits << a_right_2 >> a_left_2 & a_mask_2)
+            if b_hits:
+                b_mask, b_left, b_right = jumps[1]
+                jumping |= own_pawns & b_mask & (empty << b_right) >> b_left &\
+                    (b_hits << b_right_1 >> b_left_1 & b_mask_1 | b_hits << b_right_2 >> b_left_2 & b_mask_2)
+            taking = jumping != 0
+
+            a_destinations = a_steps & empty
+            b_destinations = b_steps & empty
+            a_count = bin(a_destinations).count('1')
+            pawn_moves = a_count + bin(b_destinations).count('1')
+        else:
+            jumping = 0
+            pawn_moves = 0
+
+        if queen_moves:
+            queen_moves.clear()
+        queens_left = own_queens
+        while queens_left and not taking:
+            src = queens_left & -queens_left
+            queens_left ^= src
+            for ray in rays[src.bit_length() - 1]:
+                # opponent figure on ray followed by empty square is taken
+                over = 0
+                for dest in ray:
+                    if empty & dest:
+                        if over:
+                            taking = True
+                            break
+                        queen_moves.append((src, dest))
+                    elif over or not opponent_figures & dest:
+                        break
+                    else:
+                        over = dest
+
+        if taking:
+            codes = calc_taking_moves(jumping, own_queens, opponent_figures, empty,
+                                      pawn_directions[up], promotion_rows[up])
+            code = codes[int(random_float()*len(codes))]
+            chain = code >> bb.CHAIN_SHIFT
+            src = 1 << (chain & 31)
+            dest = 1 << (chain >> 5*(code >> bb.LENGTH_SHIFT & 15) & 31)
+            taken = code >> bb.TAKEN_SHIFT & full
+            pawns[opponent] &= ~taken
+            queens[opponent] &= ~taken
+            no_taking_queen_moves[player] = 0
+        else:
+            r = int(random_float()*(pawn_moves + len(queen_moves)))
+            if r < pawn_moves:
+                # source is the one of two steps back that is own pawn
+                if r < a_count:
+                    dest = a_destinations
+                    for _ in range(r):
+                        dest &= dest - 1
+                    dest &= -dest
+                    src = own_pawns & (dest << a_right_1 >> a_left_1 & a_mask_1 |
+                                       dest << a_right_2 >> a_left_2 & a_mask_2)
+                else:
+                    dest = b_destinations
+                    for _ in range(r - a_count):
+                        dest &= dest - 1
+                    dest &= -dest
+                    src = own_pawns & (dest << b_right_1 >> b_left_1 & b_mask_1 |
+                                       dest << b_right_2 >> b_left_2 & b_mask_2)
+            elif queen_moves:
+                src, dest = queen_moves[r - pawn_moves]
+            else:
+                return opponent
+
+        if own_pawns & src:
+            pawns[player] ^= src
+            if dest & promotion_rows[up]:
+                queens[player] |= dest
+            else:
+                pawns[player] |= dest
+        else:
+            queens[player] = own_queens ^ src | dest
+            if not taking:
+                no_taking_queen_moves[player] += 1
+                # the same draw rule as of Checkers.push
+                if no_taking_queen_moves[player] > 15 and no_taking_queen_moves[opponent] > 15:
+                    return -1
+        player = opponent
+
+def rollouts(checkers, games, rng=random, tablebase=None):
+    # wins of player 0, wins of player 1 and draws of random games
+    counts = [0, 0, 0]
+    for _ in range(games):
+        # draw -1 is counted at the last index
+        counts[playout(checkers, rng, tablebase)] += 1
+    return tuple(counts)
+
+def init_worker(tablebase_directory):
+    # see pool_worker
+    pool_worker.init(tablebase=Tablebase(tablebase_directory) if tablebase_directory is not None else None)
+
+def rollout_task(position, bitboard, jobs, seed):
+    # jobs - list of (move codes from position, number of games)
+    rng = random.Random(seed)
+    checkers = Checkers.from_bytes(position, bitboard)
+
+    results = []
+    for codes, games in jobs:
+        for code in codes:
+            checkers.push(Move.from_code(code))
+        results.append(rollouts(checkers, games, rng, pool_worker.state['tablebase']))
+        for _ in codes:
+            checkers.pop()
+
+    return results
+
+class RolloutPool(object):
+    # random games are played by persistent worker processes, every task
+    # gets seed from generator of pool, so results depend only on its seed
+    # and not on worker that plays the task
+    def __init__(self, processes=4, seed=None, tablebase=None):
+        self.__processes = processes
+        self.__random = random.Random(seed)
+        self.__pool = multiprocessing.Pool(processes, init_worker,
+                                           (tablebase.directory if tablebase is not None else None,))
+
+    @property
+    def processes(self):
+        return self.__processes
+
+    def close(self):
+        self.__pool.terminate()
+        self.__pool.join()
+
+    def rollouts(self, checkers, jobs):
+        # jobs - list of (move codes from position, number of games), games
+        # of every job are split between workers, returns list of (wins of
+        # player 0, wins of player 1, draws) of jobs
+        position = checkers.to_bytes()
+
+        tasks = [[] for _ in range(self.__processes)]
+        for job, (codes, games) in enumerate(jobs):
+            for worker in range(self.__processes):
+                # shares of job start at different workers, so small jobs
+                # are spread too
+                share = (games + (worker - job) % self.__processes)//self.__processes
+                if share > 0:
+                    tasks[worker].append((job, codes, share))
+
+        tasks = [task for task in tasks if len(task) > 0]
+        results = self.__pool.starmap(rollout_task,
+                                      [(position, checkers.bitboard, [(codes, share) for _, codes, share in task],
+                                        self.__random.getrandbits(64)) for task in tasks])
+
+        counts = [[0, 0, 0] for _ in jobs]
+        for task, task_results in zip(tasks, results):
+            for (job, _, _), job_counts in zip(task, task_results):
+                for i in range(3):
+                    counts[job][i] += job_counts[i]
+
+        return [tuple(job_counts) for job_counts in counts]
+
+class MonteCarloTreeSearch(object):
+    # UCT search, nodes are kept in arena of parallel arrays, children of
+    # node are allocated together when it is expanded and their moves are
+    # indices in list of available moves of node. Subtree of position after
+    # played move and opponent answer is kept for the next search.
+    # simulations - playouts per move
+    # exploration - constant of UCT exploration term
+    # tablebase, pool - see get_best_move, with pool leaves are selected in
+    # batches with their visits counted before results as virtual losses,
+    # so batch spreads over the tree
+    def __init__(self, simulations, exploration=1.4, tablebase=None, pool=None):
+        self.__simulations = simulations
+        self.__exploration = exploration
+        self.__tablebase = tablebase
+        self.__pool = pool
+        self.__size = 0
+        self.__visits = np.zeros(INITIAL_NODES, dtype=np.int64)
+        # sum of results of player who made move of node, 1 win, 0.5 draw
+        self.__wins = np.zeros(INITIAL_NODES, dtype=np.float64)
+        self.__first_child = np.zeros(INITIAL_NODES, dtype=np.int32)
+        self.__child_count = np.zeros(INITIAL_NODES, dtype=np.int32)
+        self.__move = np.zeros(INITIAL_NODES, dtype=np.int16)
+        self.__root = None
+        self.__root_checkers = None
+
+    @property
+    def simulations(self):
+        return self.__simulations
+
+    @property
+    def nodes(self):
+        return self.__size
+
+    @property
+    def root_visits(self):
+        # playouts through current root, including ones of previous searches
+        if self.__root is None:
+            return 0
+        return int(self.__visits[self.__root])
+
+    def get_best_move(self, checkers):
+        available_moves = checkers.available_moves
+        checkers = checkers.copy()
+        self.__reuse(checkers)
+
+        if self.__pool is None:
+            for _ in range(self.__simulations):
+                path, movers = self.__descend(checkers)
+                self.__backpropagate(path, movers, rollouts(checkers, 1, random, self.__tablebase))
+                for _ in range(len(path) - 1):
+                    checkers.pop()
+        else:
+            simulations = 0
+            while simulations < self.__simulations:
+                batch = min(LEAVES_PER_WORKER*self.__pool.processes, self.__simulations - simulations)
+                leaves = []
+                for _ in range(batch):
+                    path, movers = self.__descend(checkers)
+                    leaves.append((path, movers, [move.code for move in checkers.all_moves[-(len(path) - 1):]]
+                                   if len(path) > 1 else []))
+                    for _ in range(len(path) - 1):
+                        checkers.pop()
+                counts = self.__pool.rollouts(checkers, [(codes, 1) for _, _, codes in leaves])
+                for (path, movers, _), leaf_counts in zip(leaves, counts):
+                    self.__backpropagate(path, movers, leaf_counts)
+                simulations += batch
+
+        # the most visited move is the most reliable one
+        first = self.__first_child[self.__root]
+        count = self.__child_count[self.__root]
+        best = first + int(np.argmax(self.__visits[first:first + count]))
+
+        return available_moves[self.__move[best]]
+
+    def __reuse(self, checkers):
+        root = None
+        if self.__root_checkers is not None:
+            root = self.__find(self.__root, self.__root_checkers, checkers.key, 2)
+
+        if root is None:
+            self.__size = 0
+            root = self.__new_nodes(1)
+            self.__move[root] = -1
+        else:
+            root = self.__compact(root)
+
+        self.__root = root
+        self.__root_checkers = checkers.copy()
+
+    def __find(self, node, checkers, key, depth):
+        # node of position with key at most depth moves below node
+        if checkers.key == key:
+            return node
+        if depth == 0:
+            return None
+
+        available_moves = checkers.available_moves
+        first = self.__first_child[node]
+        for child in range(first, first + self.__child_count[node]):
+            checkers.push(available_moves[self.__move[child]])
+            found = self.__find(child, checkers, key, depth - 1)
+            checkers.pop()
+            if found is not None:
+                return found
+
+        return None
+
+    def __compact(self, root):
+        # subtree of root is moved to the start of arena level by level, so
+        # children of every node stay together, root is then node 0
+        levels = []
+        frontier = np.array([root])
+        while len(frontier) > 0:
+            levels.append(frontier)
+            counts = self.__child_count[frontier]
+            offsets = np.cumsum(counts) - counts
+            frontier = np.repeat(self.__first_child[frontier] - offsets, counts) + np.arange(counts.sum())
+        order = np.concatenate(levels)
+
+        new_index = np.full(self.__size, -1, dtype=np.int32)
+        new_index[order] = np.arange(len(order))
+        first_child = self.__first_child[order]
+        expanded = first_child >= 0
+        first_child[expanded] = new_index[first_child[expanded]]
+
+        size = len(order)
+        self.__visits[:size] = self.__visits[order]
+        self.__wins[:size] = self.__wins[order]
+        self.__child_count[:size] = self.__child_count[order]
+        self.__move[:size] = self.__move[order]
+        self.__first_child[:size] = first_child
+        self.__size = size
+
+        return 0
+
+    def __allocate(self, capacity):
+        self.__visits = self.__grown(self.__visits, capacity)
+        self.__wins = self.__grown(self.__wins, capacity)
+        self.__first_child = self.__grown(self.__first_child, capacity)
+        self.__child_count = self.__grown(self.__child_count, capacity)
+        self.__move = self.__grown(self.__move, capacity)
+
+    def __grown(self, array, capacity):
+        new_array = np.zeros(capacity, dtype=array.dtype)
+        new_array[:self.__size] = array[:self.__size]
+        return new_array
+
+    def __new_nodes(self, count):
+        # index of the first of count new unexpanded nodes
+        if self.__size + count > len(self.__visits):
+            self.__allocate(2*max(len(self.__visits), count))
+        first = self.__size
+        self.__size += count
+        self.__visits[first:self.__size] = 0
+        self.__wins[first:self.__size] = 0
+        self.__first_child[first:self.__size] = -1
+        self.__child_count[first:self.__size] = 0
+        return first
+
+    def __expand(self, node, count):
+        first = self.__new_nodes(count)
+        self.__move[first:first + count] = np.arange(count)
+        self.__first_child[node] = first
+        self.__child_count[node] = count
+
+    def __select(self, node):
+        # unvisited children first, then the one with the best UCT score
+        first = self.__first_child[node]
+        visits = self.__visits[first:first + self.__child_count[node]]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited) > 0:
+            return first + int(random.choice(unvisited))
+
+        uct = self.__wins[first:first + len(visits)]/visits +\
+              self.__exploration*np.sqrt(math.log(self.__visits[node])/visits)
+        return first + int(np.argmax(uct))
+
+    def __descend(self, checkers):
+        # selection and expansion, moves to the leaf stay pushed on checkers,
+        # visits of path are counted at once
+        node = self.__root
+        path = [node]
+        movers = [checkers.opponent()]
+
+        # selection
+        while self.__first_child[node] >= 0:
+            node = self.__select(node)
+            movers.append(checkers.player_turn)
+            checkers.push(checkers.available_moves[self.__move[node]])
+            path.append(node)
+
+        # expansion
+        if not checkers.end:
+            self.__expand(node, len(checkers.available_moves))
+            node = self.__select(node)
+            movers.append(checkers.player_turn)
+            checkers.push(checkers.available_moves[self.__move[node]])
+            path.append(node)
+
+        path = np.array(path)
+        self.__visits[path] += 1
+
+        return path, np.array(movers)
 
-    available_moves = checkers.calc_available_moves_for_player(checkers.player_turn)
-    move_score = []
-
-    for move in available_moves:
-
-        player_1 = ai_player.AIPlayerRandom(1 - player_num)
-        player_2 = ai_player.AIPlayerRandom(player_num)
-
-        s = 0
-        for _ in range(simulations):
-            new_checkers = checkers.copy()
-            new_checkers.make_move(move, False)
-            while not new_checkers.end:
-                if new_checkers.player_turn == player_1.num:
-                    move, _, _ = player_1.make_move(new_checkers)
-
-                elif new_checkers.player_turn == player_2.num:
-                    move, _, _ = player_2.make_move(new_checkers)
-                
-            if new_checkers.winner == player_num:
-                s += 5
-            elif new_checkers.winner == -1:
-                s += 1
-        
-        move_score.append(s)
-    
-    return available_moves[move_score.index(max(move_score))]
\ No newline at end of file
+    def __backpropagate(self, path, movers, counts):
+        # counts - wins of player 0, wins of player 1 and draws of playouts
+        self.__wins[path[movers == 0]] += counts[0]
+        self.__wins[path[movers == 1]] += counts[1]
+        self.__wins[path] += 0.5*counts[2]
@@ -0,0 +1,82 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import src.robot.game_logic.bitboard as bb
+
+# killer moves kept per ply
+KILLERS = 2
+
+class MoveOrdering(object):
+    # order of moves: hash move, taking moves by number of taken figures
+    # and promotion, killer moves of ply, then by history heuristic
+    def __init__(self):
+        self.__killers = {}
+        # history[player][32*src + dest] - sum of depth^2 of cutoffs
+        self.__history = [[0]*bb.SQUARES**2 for _ in range(2)]
+        self.__cutoffs = 0
+        self.__first_move_cutoffs = 0
+
+    @property
+    def cutoffs(self):
+        return self.__cutoffs
+
+    @property
+    def first_move_cutoffs(self):
+        return self.__first_move_cutoffs
+
+    @property
+    def first_move_cutoff_rate(self):
+        if self.__cutoffs == 0:
+            return 0
+        return self.__first_move_cutoffs/self.__cutoffs
+
+    def new_search(self):
+        # killers of previous search are too deep, history is halved so
+        # newer cutoffs weigh more
+        self.__killers = {}
+        for history in self.__history:
+            for i in range(len(history)):
+                history[i] >>= 1
+
+    def reset_stats(self):
+        self.__cutoffs = 0
+        self.__first_move_cutoffs = 0
+
+    def order(self, moves, hash_move, player, ply, indices=None):
+        # returns indices of moves in search order, moves with the same
+        # priority keep order of given indices
+        killers = self.__killers.get(ply, ())
+        history = self.__history[player]
+
+        def priority(i):
+            code = moves[i].code
+            taken = bin(code >> bb.TAKEN_SHIFT & bb.FULL).count('1')
+            if taken == 0:
+                killer = code >> 1 in killers
+                return (i == hash_move, 0, code & bb.PROMOTED, killer,
+                        history[bb.SQUARES*bb.move_src(code) + bb.move_dest(code)])
+            return (i == hash_move, taken, code & bb.PROMOTED, False, 0)
+
+        if indices is None:
+            indices = range(len(moves))
+
+        return sorted(indices, key=priority, reverse=True)
+
+    def cutoff(self, move, player, ply, depth, searched):
+        # called when move caused cutoff after searched moves were searched
+        self.__cutoffs += 1
+        if searched == 1:
+            self.__first_move_cutoffs += 1
+
+        if move.taken_mask != 0:
+            return
+
+        killers = self.__killers.setdefault(ply, [])
+        if move.key not in killers:
+            killers.insert(0, move.key)
+            del killers[KILLERS:]
+
+        self.__history[player][bb.SQUARES*move.src_square + move.dest_square] += depth*depth
@@ -0,0 +1,120 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import math
+import random
+import numpy as np
+
+import src.robot.ai.alphabeta as alphabeta
+import src.robot.ai.evaluation as evaluation
+import src.robot.game_logic.serialization as serialization
+from src.robot.ai.move_ordering import MoveOrdering
+from src.robot.ai.quiescence import QuiescenceSearch
+from src.robot.ai.transposition_table import TranspositionTable
+from src.robot.game_logic.checkers import Checkers, Move
+
+BOOK_MAGIC = b'CKB'
+
+# one record per book move, sorted by position key, move code is stored as
+# two 64 bit words as in game records
+BOOK_DTYPE = np.dtype([('key', '<u8'),
+                       ('low', '<u8'),
+                       ('high', '<u8'),
+                       ('weight', '<u4')])
+
+class OpeningBook(object):
+    # book file is memory-mapped, lookups read only pages they need
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            serialization.check_header(file.read(serialization.HEADER_SIZE), BOOK_MAGIC)
+
+        if os.path.getsize(path) > serialization.HEADER_SIZE:
+            self.__records = np.memmap(path, dtype=BOOK_DTYPE, mode='r', offset=serialization.HEADER_SIZE)
+        else:
+            self.__records = np.zeros(0, dtype=BOOK_DTYPE)
+        self.__keys = self.__records['key']
+
+    def __len__(self):
+        return len(self.__records)
+
+    def moves(self, key):
+        # list of (move code, weight) of position key
+        key = np.uint64(key)
+        start = np.searchsorted(self.__keys, key, 'left')
+        end = np.searchsorted(self.__keys, key, 'right')
+        records = self.__records[start:end]
+        return [(int(low) | int(high) << 64, int(weight))
+                for low, high, weight in zip(records['low'], records['high'], records['weight'])]
+
+    def get_move(self, checkers):
+        # weighted random book move of position or None
+        moves = [(Move.from_code(code), weight) for code, weight in self.moves(checkers.key)]
+        moves = [(move, weight) for move, weight in moves if checkers.is_move_valid(move)]
+        if len(moves) == 0:
+            return None
+
+        move = random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+        # move object of checkers, with its promotion flag
+        for available_move in checkers.available_moves:
+            if available_move == move:
+                return available_move
+
+def build_book(path, plies=4, depth=6, margin=0.2, weights=evaluation.DEFAULT_WEIGHTS, quiescence_depth=8):
+    # every move of every position in the first plies from both starting
+    # setups is scored with search of given depth, moves at most margin
+    # worse than the best one are stored with weight growing with score
+    book = {}
+    table = TranspositionTable(64)
+    ordering = MoveOrdering()
+    quiescence = QuiescenceSearch(quiescence_depth) if quiescence_depth is not None else None
+
+    for robot_color in (0, 1):
+        checkers = Checkers(robot_color, bitboard=True, weights=weights)
+        __expand(checkers, plies, depth, margin, table, ordering, quiescence, book)
+
+    write_book(path, book)
+
+    return len(book)
+
+def __expand(checkers, plies, depth, margin, table, ordering, quiescence, book):
+    if plies == 0 or checkers.end or checkers.key in book:
+        return
+
+    ordering.new_search()
+    table.new_search()
+    scores = [alphabeta.search_move(checkers, move, depth, -math.inf, table, None, ordering, quiescence)
+              for move in checkers.available_moves]
+
+    best_score = max(scores)
+    book[checkers.key] = {move.code: 1 + int(100*(1 - (best_score - score)/margin))
+                          for move, score in zip(checkers.available_moves, scores)
+                          if score >= best_score - margin}
+
+    for move in checkers.available_moves:
+        checkers.push(move)
+        __expand(checkers, plies - 1, depth, margin, table, ordering, quiescence, book)
+        checkers.pop()
+
+def write_book(path, book):
+    # book - dict of position key to dict of move code to weight
+    records = np.zeros(sum(len(moves) for moves in book.values()), dtype=BOOK_DTYPE)
+    i = 0
+    for key in sorted(book):
+        for code, weight in book[key].items():
+            records[i] = (key, code & (1 << 64) - 1, code >> 64, weight)
+            i += 1
+
+    with open(path, 'wb') as file:
+        file.write(serialization.header(BOOK_MAGIC))
+        file.write(records.tobytes())
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(dir_path, 'opening_book.bin')
+    plies = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+
+    positions = build_book(path, plies, depth)
+    print(f'{positions} positions written to {path}')
@@ -0,0 +1,177 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import math
+import multiprocessing
+import queue
+from time import perf_counter
+
+import src.robot.ai.alphabeta as alphabeta
+import src.robot.ai.pool_worker as pool_worker
+import src.robot.ai.transposition_table as tt
+import src.robot.ai.evaluation as evaluation
+from src.robot.ai.move_ordering import MoveOrdering
+from src.robot.ai.quiescence import QuiescenceSearch
+from src.robot.ai.endgame_tablebase import Tablebase
+from src.robot.game_logic.checkers import Checkers, Move
+
+def init_worker(table_memory_mb, table_name, quiescence_depth, weights, tablebase_directory=None,
+                best_score=None):
+    # worker state is kept between searches, see pool_worker
+    table = None
+    if table_name is not None:
+        table = tt.TranspositionTable(name=table_name)
+    elif table_memory_mb is not None:
+        table = tt.TranspositionTable(table_memory_mb)
+    pool_worker.init(table=table,
+                     ordering=MoveOrdering(),
+                     quiescence=QuiescenceSearch(quiescence_depth) if quiescence_depth is not None else None,
+                     weights=weights,
+                     tablebase=Tablebase(tablebase_directory) if tablebase_directory is not None else None,
+                     shared_alpha=alphabeta.SharedAlpha(best_score) if best_score is not None else None,
+                     search_id=None)
+
+def search_task(search_id, position, bitboard, code, depth, alpha, deadline):
+    # score of one root move or None when deadline passed
+    state = pool_worker.state
+    table = state['table']
+    ordering = state['ordering']
+    shared_alpha = state['shared_alpha']
+    if search_id != state['search_id']:
+        state['search_id'] = search_id
+        ordering.new_search()
+        if table is not None:
+            table.new_search(search_id)
+
+    checkers = Checkers.from_bytes(position, bitboard)
+    checkers.set_weights(state['weights'])
+    if deadline is not None:
+        deadline = alphabeta.Deadline(deadline)
+    if shared_alpha is not None:
+        shared_alpha.reset()
+    try:
+        return alphabeta.search_move(checkers, Move.from_code(code), depth, alpha, table, deadline, ordering,
+                                     state['quiescence'], state['tablebase'], shared_alpha)
+    except alphabeta.SearchTimeout:
+        return None
+
+class ParallelAlphaBeta(object):
+    # root moves are split between persistent worker processes: first move
+    # is searched alone, then the rest in parallel, every one with the best
+    # score known when it is started as alpha. The best score is also kept
+    # in shared memory and workers raise their alpha to it during search,
+    # just below it, so move failing low on it never ties with the best.
+    # Chosen move is the same as of serial search, the first of root order
+    # with the best score.
+    # shared_table - workers use one table in shared memory, so they do not
+    # repeat work of each other, otherwise every worker has its own table
+    # quiescence_depth, weights - see AIPlayerAlphaBeta
+    # tablebase - Tablebase, workers open its directory
+    def __init__(self, processes=4, table_memory_mb=16, shared_table=True, quiescence_depth=None,
+                 weights=evaluation.DEFAULT_WEIGHTS, tablebase=None):
+        self.__processes = processes
+        self.__table = None
+        self.__shared_table = shared_table and table_memory_mb is not None
+        if self.__shared_table:
+            self.__table = tt.TranspositionTable(table_memory_mb, shared=True)
+        elif table_memory_mb is not None:
+            # root best moves for iterative deepening
+            self.__table = tt.TranspositionTable(1)
+        self.__best_score = multiprocessing.RawValue('d', -math.inf)
+        self.__pool = multiprocessing.Pool(processes, init_worker,
+                                           (table_memory_mb, self.__table.name if self.__shared_table else None,
+                                            quiescence_depth, weights,
+                                            tablebase.directory if tablebase is not None else None,
+                                            self.__best_score))
+        self.__ordering = MoveOrdering()
+        self.__search_id = 0
+
+    @property
+    def processes(self):
+        return self.__processes
+
+    @property
+    def table_name(self):
+        # name of shared table or None
+        return self.__table.name if self.__shared_table else None
+
+    def close(self):
+        self.__pool.terminate()
+        self.__pool.join()
+        if self.__shared_table:
+            self.__table.close(unlink=True)
+
+    def get_best_move(self, checkers, depth, time_budget=None):
+        self.__search_id += 1
+        self.__ordering.new_search()
+        if self.__table is not None:
+            self.__table.new_search(self.__search_id)
+
+        if time_budget is None:
+            best_move, _ = self.__search_root(checkers, depth)
+            return best_move
+
+        deadline = perf_counter() + time_budget
+
+        available_moves = checkers.available_moves
+        if len(available_moves) == 1:
+            return available_moves[0]
+
+        best_move, score = self.__search_root(checkers, 1)
+
+        current_depth = 2
+        while (depth is None or current_depth <= depth) and abs(score) < 1e9:
+            try:
+                best_move, score = self.__search_root(checkers, current_depth, deadline)
+            except alphabeta.SearchTimeout:
+                break
+            current_depth += 1
+
+        return best_move
+
+    def __search_root(self, checkers, depth, deadline=None):
+        position = checkers.to_bytes()
+        available_moves = checkers.available_moves
+        order = alphabeta.root_order(checkers, self.__table, self.__ordering)
+
+        # results of abandoned searches go to their own queue
+        results = queue.Queue()
+
+        def submit(rank, alpha):
+            self.__pool.apply_async(search_task,
+                                    (self.__search_id, position, checkers.bitboard,
+                                     available_moves[order[rank]].code, depth, alpha, deadline),
+                                    callback=lambda score: results.put((rank, score)),
+                                    error_callback=lambda error: results.put((rank, error)))
+
+        best_score = -math.inf
+        best_rank = None
+        next_rank = 0
+        pending = 0
+        self.__best_score.value = -math.inf
+        while next_rank < len(order) or pending > 0:
+            # first move is searched alone to get bound for the rest
+            while next_rank < len(order) and pending < self.__processes and\
+                  (next_rank == 0 or best_rank is not None):
+                submit(next_rank, best_score)
+                next_rank += 1
+                pending += 1
+
+            rank, score = results.get()
+            pending -= 1
+            if isinstance(score, Exception):
+                raise score
+            if score is None:
+                raise alphabeta.SearchTimeout()
+            if best_rank is None or score > best_score or (score == best_score and rank < best_rank):
+                best_score = score
+                best_rank = rank
+                self.__best_score.value = math.nextafter(best_score, -math.inf)
+
+        if self.__table is not None:
+            self.__table.store(checkers.key, depth, tt.EXACT, best_score, order[best_rank])
+
+        return available_moves[order[best_rank]], best_score
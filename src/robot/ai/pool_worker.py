@@ -0,0 +1,16 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+# state of multiprocessing pool worker, set by initializer of the pool and
+# kept between its tasks, e.g. opened tablebase or transposition table.
+# Pool pickles initializer and task functions by name, so they are module
+# functions, not private and not in class, whose body would mangle their
+# names, and they keep their state here
+state = {}
+
+def init(**values):
+    state.clear()
+    state.update(values)
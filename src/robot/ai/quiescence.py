@@ -0,0 +1,59 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import src.robot.ai.evaluation as evaluation
+
+class QuiescenceSearch(object):
+    # position at the search horizon is evaluated only when it is quiet,
+    # taking is mandatory, so forced taking lines are searched further,
+    # at most max_depth moves
+    def __init__(self, max_depth=8, evaluate=evaluation.evaluate):
+        self.__max_depth = max_depth
+        self.__evaluate = evaluate
+        self.__nodes = 0
+
+    @property
+    def max_depth(self):
+        return self.__max_depth
+
+    @property
+    def nodes(self):
+        return self.__nodes
+
+    def reset_stats(self):
+        self.__nodes = 0
+
+    def search(self, checkers, alpha, beta, player_num, depth=0):
+        self.__nodes += 1
+        if checkers.end:
+            if checkers.winner == -1:
+                return 0
+            return 1e10*(-1, 1)[checkers.winner == player_num]
+
+        available_moves = checkers.available_moves
+        if depth >= self.__max_depth or available_moves[0].taken_mask == 0:
+            return self.__evaluate(checkers, player_num)
+
+        if checkers.player_turn == player_num:
+            val = -1e10
+            for move in available_moves:
+                checkers.push(move)
+                val = max(val, self.search(checkers, alpha, beta, player_num, depth + 1))
+                checkers.pop()
+                if val >= beta:
+                    break
+                alpha = max(alpha, val)
+        else:
+            val = 1e10
+            for move in available_moves:
+                checkers.push(move)
+                val = min(val, self.search(checkers, alpha, beta, player_num, depth + 1))
+                checkers.pop()
+                if val <= alpha:
+                    break
+                beta = min(beta, val)
+
+        return val
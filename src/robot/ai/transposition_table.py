@@ -0,0 +1,128 @@
+import numpy as np
+import struct
+from multiprocessing import shared_memory
+
+# bound types of stored score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# best move is stored as index in list of available moves, generation order
+# is the same every time position is visited
+NO_MOVE = 0xFFFF
+
+# entry is stored as check, score and meta words, score is float64 and meta
+# packs depth, bound, move, generation and valid flag, check is xor of key
+# and both other words. Entry written by other process at the same time can
+# be torn, its key check then fails.
+ENTRY_DTYPE = np.dtype([('check', '<u8'), ('score', '<u8'), ('meta', '<u8')])
+
+VALID = 1 << 40
+
+__SCORE = struct.Struct('<d')
+__WORD = struct.Struct('<Q')
+
+def pack_score(score):
+    return __WORD.unpack(__SCORE.pack(score))[0]
+
+def unpack_score(bits):
+    return __SCORE.unpack(__WORD.pack(bits))[0]
+
+def pack_meta(depth, bound, move, generation):
+    return VALID | generation << 32 | move << 16 | bound << 8 | depth
+
+def unpack_meta(meta):
+    # (depth, bound, move, generation)
+    return meta & 0xFF, meta >> 8 & 0xFF, meta >> 16 & 0xFFFF, meta >> 32 & 0xFF
+
+class TranspositionTable(object):
+    # fixed size table indexed by lowest bits of zobrist key, memory is
+    # given in MB and rounded down to power of two number of entries
+    # shared - table is created in shared memory, other processes can use
+    # it by its name
+    def __init__(self, memory_mb=16, shared=False, name=None):
+        self.__shared_memory = None
+
+        if name is not None:
+            self.__shared_memory = shared_memory.SharedMemory(name)
+            memory = self.__shared_memory.size
+        else:
+            memory = memory_mb*2**20
+
+        size = 1
+        while 2*size*ENTRY_DTYPE.itemsize <= memory:
+            size *= 2
+
+        if name is None and shared:
+            self.__shared_memory = shared_memory.SharedMemory(create=True, size=size*ENTRY_DTYPE.itemsize)
+            self.__shared_memory.buf[:] = bytes(self.__shared_memory.size)
+
+        if self.__shared_memory is not None:
+            self.__entries = np.ndarray(size, dtype=ENTRY_DTYPE, buffer=self.__shared_memory.buf)
+        else:
+            self.__entries = np.zeros(size, dtype=ENTRY_DTYPE)
+
+        self.__mask = size - 1
+        self.__checks = self.__entries['check']
+        self.__scores = self.__entries['score']
+        self.__metas = self.__entries['meta']
+        self.__generation = 0
+
+    @property
+    def size(self):
+        return self.__mask + 1
+
+    @property
+    def memory(self):
+        return self.__entries.nbytes
+
+    @property
+    def name(self):
+        # name of shared memory or None
+        if self.__shared_memory is None:
+            return None
+        return self.__shared_memory.name
+
+    def close(self, unlink=False):
+        # releases shared memory, the creating process should unlink it
+        if self.__shared_memory is None:
+            return
+        self.__entries = self.__checks = self.__scores = self.__metas = None
+        self.__shared_memory.close()
+        if unlink:
+            self.__shared_memory.unlink()
+        self.__shared_memory = None
+
+    def new_search(self, generation=None):
+        # entries of previous searches are kept, but can be replaced first,
+        # processes sharing table should use the same generation
+        if generation is None:
+            generation = self.__generation + 1
+        self.__generation = generation % 256
+
+    def clear(self):
+        self.__entries[:] = 0
+
+    def probe(self, key):
+        # returns (depth, bound, score, move index) or None
+        i = key & self.__mask
+        meta = int(self.__metas[i])
+        score = int(self.__scores[i])
+        if not meta & VALID or int(self.__checks[i]) ^ score ^ meta != key:
+            return None
+        depth, bound, move, _ = unpack_meta(meta)
+        return depth, bound, unpack_score(score), move
+
+    def store(self, key, depth, bound, score, move=NO_MOVE):
+        # deeper results of current search are kept, everything else is replaced
+        i = key & self.__mask
+        meta = int(self.__metas[i])
+        if meta & VALID and int(self.__checks[i]) ^ int(self.__scores[i]) ^ meta != key:
+            old_depth, _, _, old_generation = unpack_meta(meta)
+            if old_generation == self.__generation and old_depth > depth:
+                return
+        score = pack_score(score)
+        meta = pack_meta(depth, bound, move, self.__generation)
+        self.__checks[i] = key ^ score ^ meta
+        self.__scores[i] = score
+        self.__metas[i] = meta
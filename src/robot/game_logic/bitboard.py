@@ -0,0 +1,424 @@
+import numpy as np
+
+# playable squares are packed into 32 bits, row by row:
+# square = 4*y + x//2, where (x + y) % 2 == 1
+SQUARES = 32
+FULL = (1 << SQUARES) - 1
+
+SQUARE_POS = tuple(((2*(s % 4) + 1 - (s//4) % 2), s//4) for s in range(SQUARES))
+
+# POS_SQUARE[(x, y)] - packed square index of playable square
+POS_SQUARE = {pos: s for s, pos in enumerate(SQUARE_POS)}
+
+SQUARE_X = np.array([x for x, _ in SQUARE_POS])
+SQUARE_Y = np.array([y for _, y in SQUARE_POS])
+SQUARE_BITS = np.left_shift(1, np.arange(SQUARES), dtype=np.int64)
+
+NON_PLAYABLE = np.ones((8, 8), dtype=bool)
+NON_PLAYABLE[SQUARE_X, SQUARE_Y] = False
+
+# diagonal directions as (x_dir, y_dir), first two go towards y = 0
+DIRECTIONS = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+DIRECTIONS_DOWN = (0, 1)
+DIRECTIONS_UP = (2, 3)
+
+def __calc_neighbours():
+    neighbours = []
+    for x_dir, y_dir in DIRECTIONS:
+        direction_neighbours = []
+        for x, y in SQUARE_POS:
+            direction_neighbours.append(POS_SQUARE.get((x + x_dir, y + y_dir), -1))
+        neighbours.append(tuple(direction_neighbours))
+    return tuple(neighbours)
+
+# NEIGHBOURS[d][s] - next square from s in direction d or -1 outside board
+NEIGHBOURS = __calc_neighbours()
+
+def __calc_rays():
+    rays = []
+    for d in range(len(DIRECTIONS)):
+        direction_rays = []
+        for s in range(SQUARES):
+            ray = []
+            n = NEIGHBOURS[d][s]
+            while n != -1:
+                ray.append(n)
+                n = NEIGHBOURS[d][n]
+            direction_rays.append(tuple(ray))
+        rays.append(tuple(direction_rays))
+    return tuple(rays)
+
+# RAYS[d][s] - all squares from s (exclusive) to the board edge in direction d
+RAYS = __calc_rays()
+
+# SQUARE_RAYS[s] - rays from s in all directions
+SQUARE_RAYS = tuple(tuple(RAYS[d][s] for d in range(len(DIRECTIONS))) for s in range(SQUARES))
+
+# SQUARE_RAY_BITS[s] - rays of SQUARE_RAYS[s] as bits of their squares
+SQUARE_RAY_BITS = tuple(tuple(tuple(1 << n for n in ray) for ray in rays) for rays in SQUARE_RAYS)
+
+def __calc_shifts():
+    # in packed layout the square delta in given direction depends on
+    # row parity, so every direction is a set of (source mask, shift) pairs
+    shifts = []
+    for d in range(len(DIRECTIONS)):
+        masks = {}
+        for s in range(SQUARES):
+            n = NEIGHBOURS[d][s]
+            if n != -1:
+                masks[n - s] = masks.get(n - s, 0) | (1 << s)
+        shifts.append(tuple((mask, shift) for shift, mask in masks.items()))
+    return tuple(shifts)
+
+# SHIFTS[d] - tuple of (mask, shift) pairs moving bits one step in direction d
+SHIFTS = __calc_shifts()
+
+def __calc_pawn_steps():
+    # steps and jumps of pawns in directions of player moving towards row 0
+    # (index 0) and row 7 (index 1), shifts are given as left and right
+    # shift, one of them 0, so they are applied as (bb << left) >> right
+    steps = []
+    jumps = []
+    for directions in (DIRECTIONS_DOWN, DIRECTIONS_UP):
+        direction_steps = []
+        direction_jumps = []
+        for d in directions:
+            direction_steps.append(tuple((mask, max(s, 0), max(-s, 0)) for mask, s in SHIFTS[d]))
+            sources = [s for s in range(SQUARES) if NEIGHBOURS[d][s] != -1 and NEIGHBOURS[d][NEIGHBOURS[d][s]] != -1]
+            delta, = set(NEIGHBOURS[d][NEIGHBOURS[d][s]] - s for s in sources)
+            direction_jumps.append((sum(1 << s for s in sources), max(delta, 0), max(-delta, 0)))
+        steps.append(tuple(direction_steps))
+        jumps.append(tuple(direction_jumps))
+    return tuple(steps), tuple(jumps)
+
+# PAWN_STEPS[up][i] - (mask, left, right) pairs of one step in i-th pawn
+# direction, PAWN_JUMPS[up][i] - (mask, left, right) of jump over one square
+PAWN_STEPS, PAWN_JUMPS = __calc_pawn_steps()
+
+def shift(bb, d):
+    result = 0
+    for mask, s in SHIFTS[d]:
+        if s > 0:
+            result |= (bb & mask) << s
+        else:
+            result |= (bb & mask) >> -s
+    return result
+
+def squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+def board_to_bitboards(board):
+    # returns pawns and queens bitboards indexed by player
+    pawns = [0, 0]
+    queens = [0, 0]
+    for s, pos in enumerate(SQUARE_POS):
+        figure = board[pos]
+        if figure == 0:
+            continue
+        player = (figure - 1)//2
+        if (figure - 1) % 2 == 0:
+            pawns[player] |= 1 << s
+        else:
+            queens[player] |= 1 << s
+    return pawns, queens
+
+def player_masks(board):
+    # bitboards of all figures of player 0 and player 1
+    figures = np.asarray(board)[SQUARE_X, SQUARE_Y]
+    return (int(SQUARE_BITS[(figures == 1) | (figures == 2)].sum()),
+            int(SQUARE_BITS[(figures == 3) | (figures == 4)].sum()))
+
+def bitboards_to_board(pawns, queens):
+    board = np.zeros((8, 8), dtype=np.uint8)
+    for player in range(2):
+        for s in squares(pawns[player]):
+            board[SQUARE_POS[s]] = 1 + 2*player
+        for s in squares(queens[player]):
+            board[SQUARE_POS[s]] = 2 + 2*player
+    return board
+
+# moves are packed into single int: bit 0 - promotion, bits 1-32 - taken
+# figures mask, bits 33-36 - chain length - 1, from bit 37 - 5 bits per
+# square of chain
+PROMOTED = 1
+TAKEN_SHIFT = 1
+LENGTH_SHIFT = 33
+CHAIN_SHIFT = 37
+
+# chain of regular move has two squares
+REGULAR_MOVE = 1 << LENGTH_SHIFT
+
+# promotion rows of player moving towards row 0 and towards row 7
+PROMOTION_ROWS = (0b1111, 0b1111 << 28)
+
+def __calc_regular_moves():
+    # codes of regular pawn moves to destinations given by one byte of
+    # destinations bitboard, so they are not built bit by bit
+    tables = []
+    for directions, promotion in zip((DIRECTIONS_DOWN, DIRECTIONS_UP), PROMOTION_ROWS):
+        direction_tables = []
+        for d in directions:
+            # source is one step back in opposite direction
+            back = len(DIRECTIONS) - 1 - d
+            byte_tables = []
+            for k in range(SQUARES//8):
+                byte_table = []
+                for byte in range(256):
+                    codes = []
+                    for dest in range(8*k, 8*k + 8):
+                        if byte >> (dest - 8*k) & 1 and NEIGHBOURS[back][dest] != -1:
+                            codes.append(REGULAR_MOVE | NEIGHBOURS[back][dest] << CHAIN_SHIFT |
+                                         dest << (CHAIN_SHIFT + 5) | (promotion >> dest & 1))
+                    byte_table.append(tuple(codes))
+                byte_tables.append(tuple(byte_table))
+            direction_tables.append(tuple(byte_tables))
+        tables.append(tuple(direction_tables))
+    return tuple(tables)
+
+def __calc_queen_rays():
+    rays = []
+    for s in range(SQUARES):
+        square_rays = []
+        for d in range(len(DIRECTIONS)):
+            ray = RAYS[d][s]
+            if not ray:
+                continue
+            index = [-1]*SQUARES
+            for i, n in enumerate(ray):
+                index[n] = i
+            codes = tuple(REGULAR_MOVE | s << CHAIN_SHIFT | n << (CHAIN_SHIFT + 5) for n in ray)
+            # square behind every square of ray, -1 behind the last one
+            behind = [-1]*SQUARES
+            for n, m in zip(ray, ray[1:]):
+                behind[n] = m
+            square_rays.append((sum(1 << n for n in ray), d in DIRECTIONS_UP, tuple(index),
+                                tuple(codes[:i] for i in range(len(ray) + 1)), tuple(behind), ray))
+        rays.append(tuple(square_rays))
+    return tuple(rays)
+
+# QUEEN_RAYS[s] - rays of queen on square s as (mask of squares, squares
+# increase along it, index of square in ray, codes of regular moves to the
+# first i squares, square behind square of ray, squares of ray)
+QUEEN_RAYS = __calc_queen_rays()
+
+# JUMP_TARGETS[directions][s] - (taken square, landing square) of pawn jumps
+# from s in pawn directions
+JUMP_TARGETS = {directions: tuple(tuple((NEIGHBOURS[d][s], NEIGHBOURS[d][NEIGHBOURS[d][s]]) for d in directions
+                                        if NEIGHBOURS[d][s] != -1 and NEIGHBOURS[d][NEIGHBOURS[d][s]] != -1)
+                                  for s in range(SQUARES))
+                for directions in (DIRECTIONS_DOWN, DIRECTIONS_UP)}
+
+# REGULAR_MOVES[up][i][k][byte] - codes of regular moves in i-th pawn
+# direction (see PAWN_STEPS) to squares of byte k of destinations bitboard
+REGULAR_MOVES = __calc_regular_moves()
+
+def move_code(chain, taken_mask, promoted=False):
+    code = int(promoted) | taken_mask << TAKEN_SHIFT | (len(chain) - 1) << LENGTH_SHIFT
+    for i, s in enumerate(chain):
+        code |= s << (CHAIN_SHIFT + 5*i)
+    return code
+
+def move_chain(code):
+    return tuple(code >> (CHAIN_SHIFT + 5*i) & 31 for i in range((code >> LENGTH_SHIFT & 15) + 1))
+
+def move_src(code):
+    return code >> CHAIN_SHIFT & 31
+
+def move_dest(code):
+    return code >> (CHAIN_SHIFT + 5*(code >> LENGTH_SHIFT & 15)) & 31
+
+def move_taken_mask(code):
+    return code >> TAKEN_SHIFT & FULL
+
+def board_diff_signature(vacated, occupied, removed):
+    # vacated and occupied squares of player on move, removed opponent figures
+    return vacated | occupied << SQUARES | removed << 2*SQUARES
+
+def move_board_diff_signature(code):
+    src = move_src(code)
+    dest = move_dest(code)
+    if src == dest:
+        # queen finished taking chain on its starting square
+        return board_diff_signature(0, 0, move_taken_mask(code))
+    return board_diff_signature(1 << src, 1 << dest, move_taken_mask(code))
+
+def pawn_directions(player, robot_color):
+    # robot pawns start on rows 0-2 and move towards row 7
+    if player == robot_color:
+        return DIRECTIONS_UP
+    return DIRECTIONS_DOWN
+
+def promotion_row(player, robot_color):
+    return PROMOTION_ROWS[player == robot_color]
+
+def calc_available_moves(pawns, queens, player, robot_color):
+    # returns list of move codes, taking moves are mandatory
+    own_pawns = pawns[player]
+    own_queens = queens[player]
+    opponent = pawns[1 - player] | queens[1 - player]
+    empty = FULL & ~(own_pawns | own_queens | opponent)
+    up = player == robot_color
+
+    # one step of pawns in both directions gives regular moves and opponent
+    # figures next to pawns, which are taken when the next square is empty
+    a_steps = b_steps = jumping = 0
+    if own_pawns:
+        ((a_mask_1, a_left_1, a_right_1), (a_mask_2, a_left_2, a_right_2)),\
+            ((b_mask_1, b_left_1, b_right_1), (b_mask_2, b_left_2, b_right_2)) = PAWN_STEPS[up]
+        a_steps = (own_pawns & a_mask_1) << a_left_1 >> a_right_1 | (own_pawns & a_mask_2) << a_left_2 >> a_right_2
+        b_steps = (own_pawns & b_mask_1) << b_left_1 >> b_right_1 | (own_pawns & b_mask_2) << b_left_2 >> b_right_2
+        a_hits = a_steps & opponent
+        b_hits = b_steps & opponent
+        if a_hits:
+            a_mask, a_left, a_right = PAWN_JUMPS[up][0]
+            jumping = own_pawns & a_mask & (empty << a_right) >> a_left &\
+                (a_hits << a_right_1 >> a_left_1 & a_mask_1 | a_hits << a_right_2 >> a_left_2 & a_mask_2)
+        if b_hits:
+            b_mask, b_left, b_right = PAWN_JUMPS[up][1]
+            jumping |= own_pawns & b_mask & (empty << b_right) >> b_left &\
+                (b_hits << b_right_1 >> b_left_1 & b_mask_1 | b_hits << b_right_2 >> b_left_2 & b_mask_2)
+
+    # the first figure on every ray of queen ends its regular moves, queen
+    # takes when it is opponent figure followed by empty square
+    queen_moves = None
+    taking_queens = 0
+    if own_queens:
+        queen_moves = []
+        queens_left = own_queens
+        occupied = FULL & ~empty
+        while queens_left:
+            low = queens_left & -queens_left
+            queens_left ^= low
+            for mask, increasing, index, codes, behind, _ in QUEEN_RAYS[low.bit_length() - 1]:
+                blockers = mask & occupied
+                if not blockers:
+                    queen_moves += codes[-1]
+                    continue
+                if increasing:
+                    blocker = (blockers & -blockers).bit_length() - 1
+                else:
+                    blocker = blockers.bit_length() - 1
+                queen_moves += codes[index[blocker]]
+                if opponent >> blocker & 1 and behind[blocker] != -1 and empty >> behind[blocker] & 1:
+                    taking_queens |= low
+
+    if jumping or taking_queens:
+        return calc_taking_moves(jumping, taking_queens, opponent, empty, pawn_directions(player, robot_color),
+                                 PROMOTION_ROWS[up])
+
+    moves = []
+
+    # regular moves, destinations are looked up by bytes
+    a_steps &= empty
+    if a_steps:
+        tables = REGULAR_MOVES[up][0]
+        if a_steps & 0xFF:
+            moves += tables[0][a_steps & 0xFF]
+        if a_steps & 0xFF00:
+            moves += tables[1][a_steps >> 8 & 0xFF]
+        if a_steps & 0xFF0000:
+            moves += tables[2][a_steps >> 16 & 0xFF]
+        if a_steps >> 24:
+            moves += tables[3][a_steps >> 24]
+    b_steps &= empty
+    if b_steps:
+        tables = REGULAR_MOVES[up][1]
+        if b_steps & 0xFF:
+            moves += tables[0][b_steps & 0xFF]
+        if b_steps & 0xFF00:
+            moves += tables[1][b_steps >> 8 & 0xFF]
+        if b_steps & 0xFF0000:
+            moves += tables[2][b_steps >> 16 & 0xFF]
+        if b_steps >> 24:
+            moves += tables[3][b_steps >> 24]
+
+    if queen_moves:
+        moves += queen_moves
+
+    return moves
+
+def jumping_pawns(own_pawns, opponent, empty, up):
+    # pawns that can take, found with shifts over whole board: opponent
+    # figures next to them with empty square behind, up - pawns move
+    # towards row 7
+    jumping = 0
+    for (mask, left, right), ((mask_1, left_1, right_1), (mask_2, left_2, right_2)) in\
+            zip(PAWN_JUMPS[up], PAWN_STEPS[up]):
+        jumping |= own_pawns & mask & (empty << right) >> left &\
+                   ((opponent << right_1) >> left_1 & mask_1 | (opponent << right_2) >> left_2 & mask_2)
+    return jumping
+
+def calc_taking_moves(jumping, queens, opponent, empty, directions, promotion):
+    # taking move codes of jumping pawns and of queens
+    moves = []
+
+    targets = JUMP_TARGETS[directions]
+    while jumping:
+        low = jumping & -jumping
+        jumping ^= low
+        square = low.bit_length() - 1
+        __pawn_dfs(square, opponent, empty | low, targets, promotion,
+                   square << CHAIN_SHIFT, 0, 0, moves)
+
+    while queens:
+        low = queens & -queens
+        queens ^= low
+        square = low.bit_length() - 1
+        __queen_dfs(square, opponent, empty | low, square << CHAIN_SHIFT, 0, 0, moves)
+
+    return moves
+
+def __pawn_dfs(pos, opponent, empty, targets, promotion, chain, length, taken, moves):
+    # targets - JUMP_TARGETS of pawn directions
+    next_taking_possible = False
+    for taking_pos, new_pos in targets[pos]:
+        if not opponent >> taking_pos & 1 or not empty >> new_pos & 1:
+            continue
+        next_taking_possible = True
+        __pawn_dfs(new_pos, opponent & ~(1 << taking_pos), empty, targets, promotion,
+                   chain | new_pos << (CHAIN_SHIFT + 5*(length + 1)), length + 1,
+                   taken | 1 << taking_pos, moves)
+
+    if not next_taking_possible and length > 0:
+        moves.append(chain | length << LENGTH_SHIFT | taken << TAKEN_SHIFT | (promotion >> pos & 1))
+
+def __queen_dfs(pos, opponent, empty, chain, length, taken, moves):
+    # the first figure on ray is taken when it is opponent figure, queen
+    # lands on empty squares behind it, up to the next figure
+    next_taking_possible = False
+    occupied = FULL & ~empty
+    for mask, increasing, index, _, _, ray in QUEEN_RAYS[pos]:
+        blockers = mask & occupied
+        if not blockers:
+            continue
+        if increasing:
+            taking_bit = blockers & -blockers
+        else:
+            taking_bit = 1 << (blockers.bit_length() - 1)
+        if not opponent & taking_bit:
+            continue
+        start = index[taking_bit.bit_length() - 1] + 1
+        blockers ^= taking_bit
+        if not blockers:
+            end = len(ray)
+        elif increasing:
+            end = index[(blockers & -blockers).bit_length() - 1]
+        else:
+            end = index[blockers.bit_length() - 1]
+        if start == end:
+            continue
+
+        next_taking_possible = True
+        new_opponent = opponent ^ taking_bit
+        new_empty = empty | taking_bit
+        new_taken = taken | taking_bit
+        chain_shift = CHAIN_SHIFT + 5*(length + 1)
+        for new_pos in ray[start:end]:
+            __queen_dfs(new_pos, new_opponent, new_empty, chain | new_pos << chain_shift, length + 1,
+                        new_taken, moves)
+
+    if not next_taking_possible and length > 0:
+        moves.append(chain | length << LENGTH_SHIFT | taken << TAKEN_SHIFT)
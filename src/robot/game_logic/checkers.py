@@ -1,8 +1,21 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+from collections.abc import Sequence
+
 import numpy as np
 
+import src.robot.game_logic.bitboard as bb
+import src.robot.game_logic.zobrist as zobrist
+import src.robot.game_logic.serialization as serialization
+
 class Checkers(object):
-    def __init__(self, robot_color, board=None, turn=None):
+    def __init__(self, robot_color=0, board=None, turn=None, bitboard=False, weights=None):
         self.__robot_color = robot_color
+        self.__bitboard = bitboard
         self.__end = False
         self.__player_turn = 0
         self.__board = np.zeros((8, 8), dtype=np.uint8)
@@ -10,6 +23,15 @@ class Checkers(object):
         self.__all_moves = []
         self.__turn_counter = 0
         self.__no_taking_queen_moves = [0, 0]
+        self.__undo_stack = []
+        # legal moves of player_turn in current position
+        self.__available_moves = None
+        self.__available_moves_keys = None
+        # legal moves by board diff signature, see calc_moves_between_boards
+        self.__board_diff_moves = None
+        # path buffers of taking chains dfs, at most 12 figures can be taken
+        self.__chain_buffer = [None]*13
+        self.__taken_buffer = [None]*12
 
         if board is not None:
             self.__board = board.copy()
@@ -25,14 +47,57 @@ class Checkers(object):
         if turn is not None:
             self.__player_turn = turn
 
+        # starting position of all_moves, see game_record
+        self.__start_board = self.__board.copy()
+        self.__start_turn = self.__player_turn
+        self.__start_turn_counter = 0
+        self.__start_no_taking_queen_moves = [0, 0]
+
+        if self.__bitboard:
+            self.__pawns, self.__queens = bb.board_to_bitboards(self.__board)
+
+        self.__key, self.__mirror_key = zobrist.calc_keys(self.__board, self.__player_turn, robot_color)
+
+        self.set_weights(weights)
+
     @property
     def player_turn(self):
         return self.__player_turn
 
+    @property
+    def robot_color(self):
+        return self.__robot_color
+
     @property
     def board(self):
         return self.__board.copy()
 
+    @property
+    def bitboard(self):
+        return self.__bitboard
+
+    @property
+    def available_moves(self):
+        if self.__available_moves is None:
+            self.__available_moves = self.__calc_available_moves_for_player(self.__player_turn)
+        return self.__available_moves
+
+    @property
+    def key(self):
+        return self.__key
+
+    @property
+    def canonical_key(self):
+        # same for position and its copy with colors swapped and board
+        # rotated by 180 degrees, as seen by neural network
+        if self.__player_turn ^ self.__robot_color == 0:
+            return self.__key
+        return self.__mirror_key
+
+    @property
+    def weights(self):
+        return self.__weights
+
     @property
     def end(self):
         return self.__end
@@ -52,38 +117,147 @@ class Checkers(object):
     @property
     def queens_moves_to_draw(self):
         return (15 - self.__no_taking_queen_moves[0], 15 - self.__no_taking_queen_moves[1])
+
+    def bitboards(self):
+        # pawns and queens bitboards indexed by player, see bitboard module
+        if self.__bitboard:
+            return self.__pawns.copy(), self.__queens.copy()
+        return bb.board_to_bitboards(self.__board)
     
     def copy(self):
-        checkers_copy = Checkers(self.__robot_color, self.__board.copy())
+        checkers_copy = Checkers(self.__robot_color, self.__board, bitboard=self.__bitboard)
         checkers_copy.__player_turn = self.__player_turn
+        checkers_copy.__key = self.__key
+        checkers_copy.__mirror_key = self.__mirror_key
+        checkers_copy.__end = self.__end
+        checkers_copy.__winner = self.__winner
+        checkers_copy.__all_moves = self.__all_moves.copy()
+        checkers_copy.__turn_counter = self.__turn_counter
+        checkers_copy.__no_taking_queen_moves = self.__no_taking_queen_moves.copy()
+        checkers_copy.__available_moves = self.__available_moves
+        checkers_copy.__available_moves_keys = self.__available_moves_keys
+        checkers_copy.__start_board = self.__start_board
+        checkers_copy.__start_turn = self.__start_turn
+        checkers_copy.__start_turn_counter = self.__start_turn_counter
+        checkers_copy.__start_no_taking_queen_moves = self.__start_no_taking_queen_moves
+        checkers_copy.__weights = self.__weights
+        checkers_copy.__weights_tables = self.__weights_tables
+        checkers_copy.__score = self.__score
 
         return checkers_copy
 
+    def set_weights(self, weights):
+        # weights - piece-square weights with tables(robot_color) method, see
+        # ai.evaluation, score of position is then updated with every move
+        self.__weights = weights
+        self.__weights_tables = None
+        self.__score = 0
+        if weights is not None:
+            self.__weights_tables = weights.tables(self.__robot_color)
+            for pos in bb.SQUARE_POS:
+                self.__score += self.__weights_tables[self.__board[pos]][pos]
+
+    def evaluation(self, player):
+        # piece-square score of player, requires weights
+        if player == 0:
+            return self.__score
+        return -self.__score
+
+    def to_bytes(self):
+        return serialization.encode_position(self.__board, self.__player_turn, self.__robot_color,
+                                             self.__turn_counter, self.__no_taking_queen_moves,
+                                             self.__end, self.__winner)
+
+    @classmethod
+    def from_bytes(cls, data, bitboard=False):
+        board, turn, robot_color, turn_counter, no_taking_queen_moves, end, winner =\
+            serialization.decode_position(data)
+
+        checkers = cls(robot_color, board, turn, bitboard)
+        checkers.__turn_counter = turn_counter
+        checkers.__no_taking_queen_moves = no_taking_queen_moves
+        checkers.__start_turn_counter = turn_counter
+        checkers.__start_no_taking_queen_moves = no_taking_queen_moves.copy()
+        checkers.__end = end
+        checkers.__winner = winner
+
+        return checkers
+
+    def game_record(self):
+        # starting position and all_moves in append-only game record format
+        start_position = serialization.encode_position(self.__start_board, self.__start_turn,
+                                                       self.__robot_color, self.__start_turn_counter,
+                                                       self.__start_no_taking_queen_moves, False, None)
+        return serialization.encode_game_record(start_position, [move.code for move in self.__all_moves])
+
+    @classmethod
+    def from_game_record(cls, data, bitboard=False):
+        # replays all moves of game record
+        start_position, codes = serialization.decode_game_record(data)
+        checkers = cls.from_bytes(start_position, bitboard)
+        for code in codes:
+            checkers.push(Move.from_code(code))
+
+        return checkers
+
     def make_move(self, move, validate=True):
         if validate:
             if not self.is_move_valid(move):
                 return False
 
-        if len(move.taken_figures) == 0:
-            if self.__figure_type(self.__board[move.src]) == 1:
+        promoted = self.push(move)
+        
+        return True, promoted
+
+    def push(self, move):
+        # makes move without validation, can be reverted with pop
+        src = move.src
+        dest = move.dest
+        figure = self.__board[src]
+        taken_figures = [(taken, self.__board[taken]) for taken in move.taken_figures]
+        bitboards = (self.__pawns.copy(), self.__queens.copy()) if self.__bitboard else None
+
+        self.__undo_stack.append((move, figure, taken_figures, move.promoted,
+                                  self.__no_taking_queen_moves.copy(),
+                                  self.__end, self.__winner, bitboards,
+                                  self.__available_moves, self.__available_moves_keys,
+                                  self.__key, self.__mirror_key, self.__score))
+
+        if len(taken_figures) == 0:
+            if self.__figure_type(figure) == 1:
                 self.__no_taking_queen_moves[self.__player_turn] += 1
         else:
             self.__no_taking_queen_moves[self.__player_turn] = 0
 
-        self.__board[move.dest] = self.__board[move.src]
-        self.__board[move.src] = 0
+        # taken figures are removed during the chain, so queen can finish
+        # it on square of taken figure or on its starting square
+        for taken, _ in taken_figures:
+            self.__board[taken] = 0
+        self.__board[src] = 0
+        self.__board[dest] = figure
 
         promoted = False
-        if self.__figure_type(self.__board[move.dest]) == 0 and\
-           ((move.dest[1] == 0 and self.__player_turn ^ self.__robot_color == 1) or\
-            (move.dest[1] == 7 and self.__player_turn ^ self.__robot_color == 0)):
-            self.__board[move.dest] = self.__promote_pawn_to_queen(self.__board[move.dest])
+        if self.__figure_type(figure) == 0 and\
+           ((dest[1] == 0 and self.__player_turn ^ self.__robot_color == 1) or\
+            (dest[1] == 7 and self.__player_turn ^ self.__robot_color == 0)):
+            self.__board[dest] = self.__promote_pawn_to_queen(figure)
             promoted = True
 
-        for taken in move.taken_figures:
-            self.__board[taken] = 0
+        if self.__bitboard:
+            self.__update_bitboards(move, promoted)
+
+        self.__update_keys(src, dest, figure, self.__board[dest], taken_figures)
+
+        if self.__weights_tables is not None:
+            tables = self.__weights_tables
+            self.__score += tables[self.__board[dest]][dest] - tables[figure][src]
+            for taken, taken_figure in taken_figures:
+                self.__score -= tables[taken_figure][taken]
         
         self.__next_player()
+        self.__available_moves = None
+        self.__available_moves_keys = None
+        self.__board_diff_moves = None
 
         if len(self.calc_available_moves_for_player(self.__player_turn)) == 0:
             self.__end = True
@@ -95,60 +269,74 @@ class Checkers(object):
         
         move.promoted = promoted
         self.__all_moves.append(move)
-        
-        return True, promoted
 
-    def is_move_valid(self, move):
-        # validate steps
-        step_src = move.src
+        return promoted
 
-        step_board = self.__board.copy()
-        for pos in move.chain[1:]:
-            step_dest = pos
-            if not self.__is_step_valid(step_board, step_src, step_dest):
-                return False
-            
-            step_board = self.__apply_step_to_board(step_board, step_src, step_dest)
-            
-            step_src = step_dest
-        
-        # validate taken pawns
-        step_src = move.src
+    def pop(self):
+        # reverts last move made with push or make_move
+        move, figure, taken_figures, promoted, no_taking_queen_moves,\
+            end, winner, bitboards, available_moves, available_moves_keys,\
+            key, mirror_key, score = self.__undo_stack.pop()
 
-        taken_figures = []
-        
-        step_board = self.__board.copy()
-        for pos in move.chain[1:]:
-            step_dest = pos
-            step_taken = self.__step_taken_figures(step_board, step_src, step_dest)
-            if step_taken is not None:
-                taken_figures.extend(step_taken)
-            
-            step_board = self.__apply_step_to_board(step_board, step_src, step_dest)
-
-            step_src = step_dest
-
-        # check if regular move was made while there was
-        # available move with opponent figures taking
-        if len(taken_figures) == 0:
-            for move in self.calc_available_moves_for_player(self.__player_turn):
-                if len(move.taken_figures) > 0:
-                    return False
-        
-        if set(taken_figures) != set(move.taken_figures):
-            return False
-        
-        return True
+        self.__board[move.dest] = 0
+        self.__board[move.src] = figure
+        for taken, taken_figure in taken_figures:
+            self.__board[taken] = taken_figure
+
+        if bitboards is not None:
+            self.__pawns, self.__queens = bitboards
+
+        self.__player_turn = self.opponent()
+        self.__turn_counter -= 1
+        self.__no_taking_queen_moves = no_taking_queen_moves
+        self.__end = end
+        self.__winner = winner
+        self.__available_moves = available_moves
+        self.__available_moves_keys = available_moves_keys
+        self.__board_diff_moves = None
+        self.__key = key
+        self.__mirror_key = mirror_key
+        self.__score = score
+
+        move.promoted = promoted
+        self.__all_moves.pop()
+
+        return move
+
+    def is_move_valid(self, move):
+        # move is valid if it is one of generated moves of current position
+        if self.__available_moves_keys is None:
+            self.__available_moves_keys = set(available_move.key for available_move in
+                                              self.calc_available_moves_for_player(self.__player_turn))
+
+        return move.key in self.__available_moves_keys
 
     def calc_available_moves_for_player(self, player):
+        # moves of player to move are generated once per position and shared
+        # by end detection, validation and AI players
+        if player != self.__player_turn:
+            return self.__calc_available_moves_for_player(player)
+
+        if self.__available_moves is None:
+            self.__available_moves = self.__calc_available_moves_for_player(player)
+
+        return self.__available_moves
+
+    def __calc_available_moves_for_player(self, player):
+        if self.__bitboard:
+            return MoveList(bb.calc_available_moves(self.__pawns, self.__queens, player, self.__robot_color))
+
         pawns = (1 + 2*player, 2 + 2*player)
 
         moves = []
+
+        # scratch board, taking chains are applied and reverted on it in place
+        board = self.__board.tolist()
         
-        for i in range(self.board.shape[0]):
-            for j in range(self.board.shape[1]):
-                if self.__board[i, j] in pawns:
-                    moves.extend(self.__calc_available_moves((i, j)))
+        for i in range(8):
+            for j in range(8):
+                if board[i][j] in pawns:
+                    moves.extend(self.__calc_available_moves(board, (i, j)))
 
         has_taking_move = False
         for move in moves:
@@ -164,229 +352,159 @@ class Checkers(object):
         return moves
 
     def calc_move_between_boards(self, new_board):
-        curr_board_player_figures = self.__figure_player(self.__board) == self.__player_turn
-        new_board_player_figures = self.__figure_player(new_board) == self.__player_turn
-        curr_board_opponent_figures = self.__figure_player(self.__board) == self.opponent()
-        new_board_opponent_figures = self.__figure_player(new_board) == self.opponent()
-
-        moved_figures_src = (curr_board_player_figures == True) & (new_board_player_figures == False)
+        moves = self.calc_moves_between_boards(new_board)
 
-        if np.sum(moved_figures_src) != 1:
+        if len(moves) == 0:
             return None
 
-        moved_figures_dest = (curr_board_player_figures == False) & (new_board_player_figures == True)
-
-        if np.sum(moved_figures_dest) != 1:
-            return None
-
-        moved_figure_src = np.where(moved_figures_src)
-        moved_figure_src = (moved_figure_src[0][0], moved_figure_src[1][0])
-
-        moved_figure_dest = np.where(moved_figures_dest)
-        moved_figure_dest = (moved_figure_dest[0][0], moved_figure_dest[1][0])
+        return moves[0]
 
-        available_moves = self.__calc_available_moves(moved_figure_src)
-        available_moves = list(filter(lambda move: move.dest == moved_figure_dest, available_moves))
+    def calc_moves_between_boards(self, new_board):
+        # legal moves that change current board into new_board, there can be
+        # more than one if queen can take the same figures by different chains
+        if np.any(new_board[bb.NON_PLAYABLE] != 0):
+            return []
 
-        taken_figures = (curr_board_opponent_figures == True) & (new_board_opponent_figures == False)
-        placed_opponent_figures = (curr_board_opponent_figures == False) & (new_board_opponent_figures == True)
+        player = self.__player_turn
+        opponent = self.opponent()
+        masks = bb.player_masks(self.__board)
+        new_masks = bb.player_masks(new_board)
 
-        if np.sum(placed_opponent_figures) > 0:
-            return None
+        if new_masks[opponent] & ~masks[opponent]:
+            # placed opponent figures
+            return []
 
-        taken_figures = list(zip(*list(map(list, np.where(taken_figures)))))
+        if self.__board_diff_moves is None:
+            self.__board_diff_moves = {}
+            for move in self.calc_available_moves_for_player(player):
+                signature = bb.move_board_diff_signature(move.code)
+                self.__board_diff_moves.setdefault(signature, []).append(move)
 
-        for move in available_moves:
-            if set(taken_figures) == set(move.taken_figures):
-                if self.__figure_type(self.__board[move.src]) == 0 and\
-                   self.__figure_type(new_board[move.dest]) == 1:
-                    move.promoted = True
-                return move
+        signature = bb.board_diff_signature(masks[player] & ~new_masks[player],
+                                            new_masks[player] & ~masks[player],
+                                            masks[opponent] & ~new_masks[opponent])
 
-        return None
+        return self.__board_diff_moves.get(signature, [])
 
     def opponent(self, player=None):
         if player is None:
             return 1 - self.__player_turn
         return 1 - player
 
-    def __is_step_valid(self, step_board, step_src, step_dest):
-        # move from empty square
-        if step_board[step_src] == 0:
-            return False
+    def __next_player(self):
+        self.__player_turn = self.opponent()
+        self.__turn_counter += 1
 
-        # moving not current turn players figure
-        if self.__figure_player(step_board[step_src]) != self.__player_turn:
-            return False
+    def __update_bitboards(self, move, promoted):
+        player = self.__player_turn
+        src = 1 << move.src_square
+        dest = 1 << move.dest_square
+
+        if self.__pawns[player] & src:
+            self.__pawns[player] ^= src
+            if promoted:
+                self.__queens[player] |= dest
+            else:
+                self.__pawns[player] |= dest
+        else:
+            self.__queens[player] ^= src
+            self.__queens[player] |= dest
 
-        # there is figure on dest square
-        if step_board[step_dest] != 0:
-            return False
+        opponent = self.opponent()
+        taken = ~move.taken_mask
+        self.__pawns[opponent] &= taken
+        self.__queens[opponent] &= taken
 
-        # pawn
-        if self.__figure_type(step_board[step_src]) == 0:
-            if abs(step_dest[0] - step_src[0]) == 1 and abs(step_dest[1] - step_src[1]) == 1:
-                # regular move
-                return True
-
-            y_dir = (1, -1)[self.__player_turn ^ self.__robot_color]
-            if abs(step_dest[0] - step_src[0]) == 2 and step_dest[1] - step_src[1] == 2*y_dir and\
-               self.__figure_player(step_board[(step_src[0] + step_dest[0])//2, (step_src[1] + step_dest[1])//2]) == self.opponent():
-                # taking move
-                return True
-
-        #queen
-        if self.__figure_type(step_board[step_src]) == 1:
-            if abs(step_dest[0] - step_src[0]) == abs(step_dest[1] - step_src[1]):
-                return True
-
-        return False
-
-    def __step_taken_figures(self, step_board, step_src, step_dest):
-        # pawn
-        if self.__figure_type(step_board[step_src]) == 0:
-            if abs(step_src[0] - step_dest[0]) == 2 and abs(step_src[1] - step_dest[1]) == 2 and\
-               self.__figure_player(step_board[(step_src[0] + step_dest[0])//2, (step_src[1] + step_dest[1])//2]) == self.opponent():
-                # taking move
-                return [((step_src[0] + step_dest[0])//2, (step_src[1] + step_dest[1])//2)]
-
-        #queen
-        if self.__figure_type(step_board[step_src]) == 1:
-            if abs(step_src[0] - step_dest[0]) == abs(step_src[1] - step_dest[1]):
-                fields_between = abs(step_src[0] - step_dest[0]) - 1
-                x_dir = (-1, 1)[step_dest[0] > step_src[0]]
-                y_dir = (-1, 1)[step_dest[1] > step_src[1]]
-
-                pawns = []
-                for i in range(fields_between):
-                    pos = (step_src[0] + (i + 1)*x_dir,
-                           step_src[1] + (i + 1)*y_dir)
-                    if self.__figure_player(step_board[pos]) == self.opponent():
-                        pawns.append(pos)
-
-                return pawns
-
-        return None
+    def __update_keys(self, src, dest, figure, new_figure, taken_figures):
+        figure_keys, mirror_figure_keys = zobrist.TABLES[self.__robot_color]
 
-    def __next_player(self):
-        self.__player_turn = self.opponent()
-        self.__turn_counter += 1
+        self.__key ^= figure_keys[figure][src] ^ figure_keys[new_figure][dest] ^ zobrist.SIDE_KEY
+        self.__mirror_key ^= mirror_figure_keys[figure][src] ^ mirror_figure_keys[new_figure][dest] ^\
+                             zobrist.SIDE_KEY
 
-    def __calc_available_moves(self, figure_pos):
-        figure_type = self.__figure_type(self.__board[figure_pos])
+        for taken, taken_figure in taken_figures:
+            self.__key ^= figure_keys[taken_figure][taken]
+            self.__mirror_key ^= mirror_figure_keys[taken_figure][taken]
+
+    def __calc_available_moves(self, board, figure_pos):
+        figure_type = self.__figure_type(board[figure_pos[0]][figure_pos[1]])
 
         if figure_type == 0:
-            return self.__calc_available_moves_pawn(figure_pos)
+            return self.__calc_available_moves_pawn(board, figure_pos)
         elif figure_type == 1:
-            return self.__calc_available_moves_queen(figure_pos)
-
-    def __calc_available_moves_pawn(self, figure_pos):
-        player = self.__figure_player(self.__board[figure_pos])
+            return self.__calc_available_moves_queen(board, figure_pos)
 
+    def __calc_available_moves_pawn(self, board, figure_pos):
         x, y = figure_pos
 
+        player = self.__figure_player(board[x][y])
+        opponent = self.opponent(player)
+        opponent_figures = (1 + 2*opponent, 2 + 2*opponent)
+
         y_dir = (1, -1)[player ^ self.__robot_color]
+        promotion_y = (7, 0)[player ^ self.__robot_color]
 
         available_moves = []
 
         # taking moves
-        def dfs(board, chain, taken_figures):
-            pos = chain[-1]
-            x, y = pos
-
-            next_taking_possible = False
-            for new_pos, taking_pos in (((x - 2, y + 2*y_dir), (x - 1, y + y_dir)),
-                                        ((x + 2, y + 2*y_dir), (x + 1, y + y_dir))):
-                if 0 <= new_pos[0] <= 7 and\
-                   0 <= new_pos[1] <= 7 and\
-                   self.__board[new_pos] == 0 and\
-                   self.__figure_player(self.__board[taking_pos]) == self.opponent(player):
-                    next_taking_possible = True
-
-                    new_board = board.copy()
-                    new_board[new_pos] = new_board[pos]
-                    new_board[pos] = 0
-                    new_board[taking_pos] = 0
-
-                    new_chain = chain.copy()
-                    new_chain.append(new_pos)
-
-                    new_taken_figures = taken_figures.copy()
-                    new_taken_figures.append(taking_pos)
-
-                    dfs(new_board, new_chain, new_taken_figures)
-
-            if not next_taking_possible and len(chain) > 1:
-                available_moves.append(Move(chain, taken_figures))
-
-        dfs(self.__board, [figure_pos], [])
+        self.__chain_buffer[0] = figure_pos
+        self.__pawn_dfs(board, x, y, 0, y_dir, opponent_figures, promotion_y, available_moves)
 
         # regular moves
         if len(available_moves) == 0:
-            for new_pos in ((x - 1, y + y_dir),
-                            (x + 1, y + y_dir)):
-                if 0 <= new_pos[0] <= 7 and\
-                0 <= new_pos[1] <= 7 and\
-                self.__board[new_pos] == 0:
-                    available_moves.append(Move((figure_pos, new_pos), []))
+            new_y = y + y_dir
+            if 0 <= new_y <= 7:
+                for new_x in (x - 1, x + 1):
+                    if 0 <= new_x <= 7 and board[new_x][new_y] == 0:
+                        available_moves.append(Move((figure_pos, (new_x, new_y)), [], new_y == promotion_y))
 
         return available_moves
 
-    def __calc_available_moves_queen(self, figure_pos):
-        player = self.__player_turn
-
-        x, y = figure_pos
-
-        available_moves = []
-
-        # taking moves
-        def dfs(board, chain, taken_figures):
-            pos = chain[-1]
-            x, y = pos
-
-            next_taking_possible = False
-            for y_dir in [-1, 1]:
-                for x_dir in [-1, 1]:
-                    new_x = x + x_dir
-                    new_y = y + y_dir
-
-                    while 0 <= new_x <= 7 and\
-                          0 <= new_y <= 7 and\
-                          board[(new_x, new_y)] == 0:
-                        new_x += x_dir
-                        new_y += y_dir
+    def __pawn_dfs(self, board, x, y, depth, y_dir, opponent_figures, promotion_y, available_moves):
+        chain = self.__chain_buffer
+        taken_figures = self.__taken_buffer
+
+        next_taking_possible = False
+
+        taking_y = y + y_dir
+        new_y = y + 2*y_dir
+        if 0 <= new_y <= 7:
+            for x_dir in (-1, 1):
+                new_x = x + 2*x_dir
+                taking_x = x + x_dir
+                if 0 <= new_x <= 7 and\
+                   board[new_x][new_y] == 0 and\
+                   board[taking_x][taking_y] in opponent_figures:
+                    next_taking_possible = True
 
-                    if 0 <= new_x <= 7 and\
-                       0 <= new_y <= 7 and\
-                       self.__figure_player(board[(new_x, new_y)]) == self.opponent(player):
-                        taking_pos = (new_x, new_y)
-                        new_x += x_dir
-                        new_y += y_dir
-                        while 0 <= new_x <= 7 and\
-                              0 <= new_y <= 7 and\
-                              board[(new_x, new_y)] == 0:
-                            next_taking_possible = True
+                    taken_figure = board[taking_x][taking_y]
+                    board[new_x][new_y] = board[x][y]
+                    board[x][y] = 0
+                    board[taking_x][taking_y] = 0
+                    chain[depth + 1] = (new_x, new_y)
+                    taken_figures[depth] = (taking_x, taking_y)
 
-                            new_board = board.copy()
-                            new_board[(new_x, new_y)] = new_board[pos]
-                            new_board[pos] = 0
-                            new_board[taking_pos] = 0
+                    self.__pawn_dfs(board, new_x, new_y, depth + 1, y_dir, opponent_figures, promotion_y,
+                                    available_moves)
 
-                            new_chain = chain.copy()
-                            new_chain.append((new_x, new_y))
+                    board[x][y] = board[new_x][new_y]
+                    board[new_x][new_y] = 0
+                    board[taking_x][taking_y] = taken_figure
 
-                            new_taken_figures = taken_figures.copy()
-                            new_taken_figures.append(taking_pos)
+        if not next_taking_possible and depth > 0:
+            available_moves.append(Move(chain[:depth + 1], taken_figures[:depth], y == promotion_y))
 
-                            dfs(new_board, new_chain, new_taken_figures)
+    def __calc_available_moves_queen(self, board, figure_pos):
+        x, y = figure_pos
 
-                            new_x = new_x + x_dir
-                            new_y = new_y + y_dir
+        opponent = self.opponent(self.__figure_player(board[x][y]))
+        opponent_figures = (1 + 2*opponent, 2 + 2*opponent)
 
-            if not next_taking_possible and len(chain) > 1:
-                available_moves.append(Move(chain, taken_figures))
+        available_moves = []
 
-        dfs(self.__board, [figure_pos], [])
+        # taking moves
+        self.__chain_buffer[0] = figure_pos
+        self.__queen_dfs(board, x, y, 0, opponent_figures, available_moves)
 
         # regular moves
         if len(available_moves) == 0:
@@ -396,27 +514,58 @@ class Checkers(object):
                     new_y = y + y_dir
                     while 0 <= new_x <= 7 and\
                           0 <= new_y <= 7 and\
-                          self.__board[(new_x, new_y)] == 0:
+                          board[new_x][new_y] == 0:
                         available_moves.append(Move((figure_pos, (new_x, new_y)), []))
                         new_x += x_dir
                         new_y += y_dir
 
         return available_moves
 
-    @staticmethod
-    def __apply_step_to_board(board, step_src, step_dest):
-        board[step_dest] = board[step_src]
-        board[step_src] = 0
+    def __queen_dfs(self, board, x, y, depth, opponent_figures, available_moves):
+        chain = self.__chain_buffer
+        taken_figures = self.__taken_buffer
+
+        next_taking_possible = False
+        for y_dir in [-1, 1]:
+            for x_dir in [-1, 1]:
+                taking_x = x + x_dir
+                taking_y = y + y_dir
+
+                while 0 <= taking_x <= 7 and\
+                      0 <= taking_y <= 7 and\
+                      board[taking_x][taking_y] == 0:
+                    taking_x += x_dir
+                    taking_y += y_dir
+
+                if not (0 <= taking_x <= 7 and 0 <= taking_y <= 7) or\
+                   board[taking_x][taking_y] not in opponent_figures:
+                    continue
+
+                new_x = taking_x + x_dir
+                new_y = taking_y + y_dir
+                while 0 <= new_x <= 7 and\
+                      0 <= new_y <= 7 and\
+                      board[new_x][new_y] == 0:
+                    next_taking_possible = True
 
-        if abs(step_dest[0] - step_src[0]) > 1:
-            x_dir = (-1, 1)[step_dest[0] > step_src[0]]
-            y_dir = (-1, 1)[step_dest[1] > step_src[1]]
-            for i in range(1, abs(step_dest[0] - step_src[0])):
-                x = step_src[0] + i*x_dir
-                y = step_src[1] + i*y_dir
-                board[x, y] = 0
+                    taken_figure = board[taking_x][taking_y]
+                    board[new_x][new_y] = board[x][y]
+                    board[x][y] = 0
+                    board[taking_x][taking_y] = 0
+                    chain[depth + 1] = (new_x, new_y)
+                    taken_figures[depth] = (taking_x, taking_y)
 
-        return board
+                    self.__queen_dfs(board, new_x, new_y, depth + 1, opponent_figures, available_moves)
+
+                    board[x][y] = board[new_x][new_y]
+                    board[new_x][new_y] = 0
+                    board[taking_x][taking_y] = taken_figure
+
+                    new_x += x_dir
+                    new_y += y_dir
+
+        if not next_taking_possible and depth > 0:
+            available_moves.append(Move(chain[:depth + 1], taken_figures[:depth]))
 
     @staticmethod
     def __figure_player(pawn):
@@ -449,45 +598,117 @@ class Checkers(object):
             return 4
 
 class Move(object):
-    def __init__(self, chain, taken_figures):
-        self.__chain = chain
-        self.__taken_figures = taken_figures
-        self.__promoted = False
+    # move is packed into single int (see bitboard module), chain and taken
+    # figures are decoded on access
+    __slots__ = ('__code',)
+
+    def __init__(self, chain, taken_figures, promoted=False):
+        taken_mask = 0
+        for taken in taken_figures:
+            taken_mask |= 1 << bb.POS_SQUARE[taken]
+
+        self.__code = bb.move_code([bb.POS_SQUARE[pos] for pos in chain], taken_mask, promoted)
+
+    @classmethod
+    def from_code(cls, code):
+        move = cls.__new__(cls)
+        move.__code = code
+        return move
+
+    @property
+    def code(self):
+        return self.__code
 
     @property
     def src(self):
-        return self.__chain[0]
+        return bb.SQUARE_POS[bb.move_src(self.__code)]
 
     @property
     def dest(self):
-        return self.__chain[-1]
+        return bb.SQUARE_POS[bb.move_dest(self.__code)]
+
+    @property
+    def src_square(self):
+        return bb.move_src(self.__code)
+
+    @property
+    def dest_square(self):
+        return bb.move_dest(self.__code)
 
     @property
     def chain(self):
-        return self.__chain
+        return tuple(bb.SQUARE_POS[s] for s in bb.move_chain(self.__code))
 
     @property
     def taken_figures(self):
-        return self.__taken_figures
+        return [bb.SQUARE_POS[s] for s in bb.squares(self.taken_mask)]
+
+    @property
+    def taken_mask(self):
+        return bb.move_taken_mask(self.__code)
 
     @property
     def promoted(self):
-        return self.__promoted
+        return bool(self.__code & bb.PROMOTED)
 
     @promoted.setter
     def promoted(self, value):
-        self.__promoted = value
+        if value:
+            self.__code |= bb.PROMOTED
+        else:
+            self.__code &= ~bb.PROMOTED
+
+    @property
+    def key(self):
+        # hashable identity of move, independent of promotion flag
+        return self.__code >> 1
 
     def __repr__(self):
-        return f'Move(chain={self.__chain}, taken={self.__taken_figures}, promoted={self.__promoted})'
+        return f'Move(chain={self.chain}, taken={self.taken_figures}, promoted={self.promoted})'
 
     def __eq__(self, other):
         if other is None:
             return False
         if not isinstance(other, Move):
             return None
-        if self.__chain == other.chain and\
-           self.__taken_figures == other.taken_figures and\
-           self.__promoted == other.promoted:
-            return True
-        return False
+        return self.__code == other.code
+
+    def __hash__(self):
+        return hash(self.key)
+
+class MoveList(Sequence):
+    # moves generated on bitboards, kept as move codes, Move objects are
+    # created all at once on the first access to them, so end detection
+    # and counting of moves do not create them
+    __slots__ = ('__codes', '__moves')
+
+    def __init__(self, codes):
+        self.__codes = codes
+        self.__moves = None
+
+    @property
+    def codes(self):
+        return self.__codes
+
+    def __moves_list(self):
+        if self.__moves is None:
+            self.__moves = [Move.from_code(code) for code in self.__codes]
+        return self.__moves
+
+    def __len__(self):
+        return len(self.__codes)
+
+    def __getitem__(self, index):
+        moves = self.__moves
+        if moves is None:
+            moves = self.__moves_list()
+        return moves[index]
+
+    def __iter__(self):
+        return iter(self.__moves_list())
+
+    def __contains__(self, move):
+        return move in self.__moves_list()
+
+    def __repr__(self):
+        return repr(self.__moves_list())
@@ -0,0 +1,147 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import numpy as np
+
+import src.robot.game_logic.bitboard as bb
+
+VERSION = 1
+
+POSITION_MAGIC = b'CKP'
+POSITIONS_MAGIC = b'CKN'
+GAME_RECORD_MAGIC = b'CKG'
+
+HEADER_SIZE = 4
+
+# position: 32 squares packed 2 per byte, flags, queen moves without taking
+# of both players and turn counter
+POSITION_DTYPE = np.dtype([('board', 'u1', (bb.SQUARES//2,)),
+                           ('flags', 'u1'),
+                           ('no_taking_queen_moves', 'u1', (2,)),
+                           ('turn_counter', '<u2')])
+
+# flags bits
+TURN_FLAG = 1
+ROBOT_COLOR_FLAG = 2
+END_FLAG = 4
+# winner is stored on bits 3-4 as winner + 2, -1 for draw and -2 for no winner
+WINNER_SHIFT = 3
+
+# move codes have up to 102 bits and are stored as two 64 bit words
+MOVE_DTYPE = np.dtype([('low', '<u8'), ('high', '<u8')])
+
+def header(magic):
+    return magic + bytes((VERSION,))
+
+def check_header(data, magic):
+    if bytes(data[:len(magic)]) != magic:
+        raise ValueError(f'invalid header, expected {magic}')
+    if data[len(magic)] != VERSION:
+        raise ValueError(f'unsupported version {data[len(magic)]}, expected {VERSION}')
+
+def pack_boards(boards):
+    # (N, 8, 8) boards to (N, 16) bytes
+    figures = np.asarray(boards, dtype=np.uint8)[:, bb.SQUARE_X, bb.SQUARE_Y]
+    return figures[:, 0::2] | figures[:, 1::2] << 4
+
+def unpack_boards(packed):
+    boards = np.zeros((packed.shape[0], 8, 8), dtype=np.uint8)
+    boards[:, bb.SQUARE_X[0::2], bb.SQUARE_Y[0::2]] = packed & 15
+    boards[:, bb.SQUARE_X[1::2], bb.SQUARE_Y[1::2]] = packed >> 4
+    return boards
+
+def encode_positions_array(boards, turns, robot_color, turn_counters=0, no_taking_queen_moves=0,
+                           ends=False, winners=None):
+    boards = np.asarray(boards)
+    positions = np.zeros(boards.shape[0], dtype=POSITION_DTYPE)
+
+    if winners is None:
+        winners = np.full(boards.shape[0], -2)
+
+    positions['board'] = pack_boards(boards)
+    positions['flags'] = np.asarray(turns, dtype=np.uint8)*TURN_FLAG |\
+                         np.uint8(robot_color*ROBOT_COLOR_FLAG) |\
+                         np.asarray(ends, dtype=np.uint8)*END_FLAG |\
+                         (np.asarray(winners) + 2).astype(np.uint8) << WINNER_SHIFT
+    positions['no_taking_queen_moves'] = no_taking_queen_moves
+    positions['turn_counter'] = turn_counters
+
+    return positions
+
+def decode_positions_array(positions):
+    # returns dict of arrays, winner -2 means no winner yet
+    flags = positions['flags']
+    return {
+        'boards': unpack_boards(positions['board']),
+        'turns': flags & TURN_FLAG,
+        'robot_colors': (flags & ROBOT_COLOR_FLAG) >> 1,
+        'ends': (flags & END_FLAG) != 0,
+        'winners': (flags >> WINNER_SHIFT).astype(np.int8) - 2,
+        'no_taking_queen_moves': positions['no_taking_queen_moves'],
+        'turn_counters': positions['turn_counter'],
+    }
+
+def encode_position(board, turn, robot_color, turn_counter, no_taking_queen_moves, end, winner):
+    positions = encode_positions_array(board[None], [turn], robot_color, turn_counter,
+                                       no_taking_queen_moves, [end], [-2 if winner is None else winner])
+    return header(POSITION_MAGIC) + positions.tobytes()
+
+def decode_position(data):
+    # returns (board, turn, robot_color, turn_counter, no_taking_queen_moves, end, winner)
+    check_header(data, POSITION_MAGIC)
+    position = decode_positions_array(np.frombuffer(data, dtype=POSITION_DTYPE, count=1, offset=HEADER_SIZE))
+
+    winner = int(position['winners'][0])
+    return (position['boards'][0], int(position['turns'][0]), int(position['robot_colors'][0]),
+            int(position['turn_counters'][0]), [int(n) for n in position['no_taking_queen_moves'][0]],
+            bool(position['ends'][0]), None if winner == -2 else winner)
+
+def encode_positions(boards, turns, robot_color, turn_counters=0, no_taking_queen_moves=0,
+                     ends=False, winners=None):
+    # many positions, e.g. self-play dataset, in one buffer
+    return header(POSITIONS_MAGIC) + encode_positions_array(boards, turns, robot_color, turn_counters,
+                                                            no_taking_queen_moves, ends, winners).tobytes()
+
+def decode_positions(data):
+    check_header(data, POSITIONS_MAGIC)
+    return decode_positions_array(np.frombuffer(data, dtype=POSITION_DTYPE, offset=HEADER_SIZE))
+
+def encode_moves(codes):
+    moves = np.zeros(len(codes), dtype=MOVE_DTYPE)
+    mask = (1 << 64) - 1
+    moves['low'] = [code & mask for code in codes]
+    moves['high'] = [code >> 64 for code in codes]
+    return moves.tobytes()
+
+def decode_moves(data):
+    moves = np.frombuffer(data, dtype=MOVE_DTYPE)
+    return [low | high << 64 for low, high in zip(moves['low'].tolist(), moves['high'].tolist())]
+
+class GameRecordWriter(object):
+    # append-only game record: header, starting position, then one
+    # record per move, so record of interrupted game stays readable
+    def __init__(self, path, start_position):
+        self.__file = open(path, 'wb')
+        self.__file.write(header(GAME_RECORD_MAGIC))
+        self.__file.write(start_position)
+        self.__file.flush()
+
+    def append(self, codes):
+        self.__file.write(encode_moves(codes))
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+def encode_game_record(start_position, codes):
+    return header(GAME_RECORD_MAGIC) + start_position + encode_moves(codes)
+
+def decode_game_record(data):
+    # returns start position bytes and list of move codes
+    check_header(data, GAME_RECORD_MAGIC)
+    position_size = HEADER_SIZE + POSITION_DTYPE.itemsize
+    start_position = bytes(data[HEADER_SIZE:HEADER_SIZE + position_size])
+    return start_position, decode_moves(data[HEADER_SIZE + position_size:])
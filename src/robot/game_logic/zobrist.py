@@ -0,0 +1,58 @@
+import sys
+import os
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(dir_path, '../../../'))
+
+import random
+
+import src.robot.game_logic.bitboard as bb
+
+# keys are generated from fixed seed so they stay the same between runs
+# and can be stored in files
+__random = random.Random(0x436865636B657273)
+
+# figures are keyed relative to robot color: index 1, 2 are pawn and queen
+# of player moving towards row 7, index 3, 4 of player moving towards row 0
+__FIGURE_KEYS = tuple(tuple(__random.getrandbits(64) if figure > 0 else 0 for _ in range(bb.SQUARES))
+                      for figure in range(5))
+
+# added when player moving towards row 0 is on move
+SIDE_KEY = __random.getrandbits(64)
+
+# colors swap, 180 degrees rotation maps square s to 31 - s
+FLIPPED_FIGURE = (0, 3, 4, 1, 2)
+
+def __calc_tables(robot_color):
+    figure_keys = []
+    mirror_figure_keys = []
+    for figure in range(5):
+        relative_figure = figure if robot_color == 0 else FLIPPED_FIGURE[figure]
+        keys = __FIGURE_KEYS[relative_figure]
+        mirror_keys = __FIGURE_KEYS[FLIPPED_FIGURE[relative_figure]]
+        figure_keys.append({pos: keys[s] for s, pos in enumerate(bb.SQUARE_POS)})
+        mirror_figure_keys.append({pos: mirror_keys[bb.SQUARES - 1 - s] for s, pos in enumerate(bb.SQUARE_POS)})
+    return tuple(figure_keys), tuple(mirror_figure_keys)
+
+# TABLES[robot_color] - (keys, mirror keys) indexed by [figure][(x, y)]
+TABLES = (__calc_tables(0), __calc_tables(1))
+
+def calc_keys(board, player_turn, robot_color):
+    # returns key of position and key of the same position with colors
+    # swapped and board rotated by 180 degrees
+    figure_keys, mirror_figure_keys = TABLES[robot_color]
+
+    key = 0
+    mirror_key = 0
+    for pos in bb.SQUARE_POS:
+        figure = board[pos]
+        if figure != 0:
+            key ^= figure_keys[figure][pos]
+            mirror_key ^= mirror_figure_keys[figure][pos]
+
+    if player_turn ^ robot_color == 1:
+        key ^= SIDE_KEY
+    else:
+        mirror_key ^= SIDE_KEY
+
+    return key, mirror_key
@@ -13,10 +13,24 @@ import numpy as np
 import time
 
 from robot.ai.ai_player import *
+from robot.ai.opening_book import OpeningBook
+from robot.ai.endgame_tablebase import Tablebase
 from robot.computer_vision.camera import CameraHandler, camera_config
 from robot.game_logic.checkers import Checkers, Move
 from robot.movement.driver import MovementHandler, driver_config
 
+# playouts per move of Monte Carlo tree search for difficulty 2, 3, 4
+MONTE_CARLO_SIMULATIONS = (60, 80, 100)
+
+# seconds per move of alpha-beta for difficulty 8, 9, 10
+ALPHABETA_TIME_BUDGETS = (2, 4, 8)
+
+# built with ai/opening_book.py, used by players above random if it exists
+OPENING_BOOK_PATH = os.path.join(dir_path, 'ai/opening_book.bin')
+
+# generated with ai/endgame_tablebase.py, used by players above random if it exists
+TABLEBASE_PATH = os.path.join(dir_path, 'ai/tablebases')
+
 class RobotCheckers(object):
     def __init__(self, debug=0):
         self.__debug = debug
@@ -119,27 +133,42 @@ class RobotCheckers(object):
         self.__run = False
 
         self.__robot_thread.join()
+        self.__close_ai_player()
 
         self.__camera_handler.stop()
         self.__movement_handler.stop()
 
-    def initialize_game(self, robot_color, difficulty, automatic_pawns_placement_on_start=True, board=None, turn=None):
+    def initialize_game(self, robot_color, difficulty, automatic_pawns_placement_on_start=True, board=None, turn=None, bitboard=True):
         self.__robot_color = robot_color
 
-        self.__checkers = Checkers(robot_color, board, turn)
+        # player of previous game, e.g. aborted before start
+        self.__close_ai_player()
+
+        self.__checkers = Checkers(robot_color, board, turn, bitboard)
+
+        book = None
+        if os.path.exists(OPENING_BOOK_PATH):
+            book = OpeningBook(OPENING_BOOK_PATH)
+
+        tablebase = None
+        if os.path.isdir(TABLEBASE_PATH):
+            tablebase = Tablebase(TABLEBASE_PATH)
 
         if difficulty == 1:
             # random
             self.__ai_player = AIPlayerRandom(robot_color)
         elif difficulty <= 4:
-            # MonteCarlo with 10, 20, 30 simulations per move
-            self.__ai_player = AIPlayerMonteCarlo(robot_color, (difficulty - 1)*10)
+            # Monte Carlo tree search with 60, 80, 100 simulations per move
+            self.__ai_player = AIPlayerMonteCarlo(robot_color, MONTE_CARLO_SIMULATIONS[difficulty - 2], book=book,
+                                                  tablebase=tablebase)
         elif difficulty <= 7:
             # Minimax with depth of 2, 3, 4
-            self.__ai_player = AIPlayerMinimax(robot_color, difficulty - 3)
+            self.__ai_player = AIPlayerMinimax(robot_color, difficulty - 3, book=book, tablebase=tablebase)
         else:
-            # Alpha-beta with depth of 5, 6, 7
-            self.__ai_player = AIPlayerAlphaBeta(robot_color, difficulty - 3)
+            # Alpha-beta with depth of 5, 6, 7 and 2, 4, 8 seconds per move
+            self.__ai_player = AIPlayerAlphaBeta(robot_color, difficulty - 3,
+                                                 time_budget=ALPHABETA_TIME_BUDGETS[difficulty - 8], book=book,
+                                                 tablebase=tablebase)
 
         # board preparation
         if automatic_pawns_placement_on_start:
@@ -160,6 +189,9 @@ class RobotCheckers(object):
         
     def abort_game(self):
         if self.__checkers is not None:
+            # game in play is ended by robot thread, which closes its player
+            if not self.__play:
+                self.__close_ai_player()
             self.__play = False
             self.__checkers = None
             self.__movement_handler.interrupt()
@@ -204,9 +236,14 @@ class RobotCheckers(object):
                     self.__make_move(robot_move, promoted)
                     self.__move_done = True
                 else:
+                    # engine searches answers while player thinks, pondering
+                    # is started once per turn and goes on between camera
+                    # reads until the player move is made
+                    self.__ai_player.start_pondering(self.__checkers)
                     player_move = self.__get_player_move()
 
                     if player_move is not None and self.__checkers is not None and self.__checkers.is_move_valid(player_move):
+                        self.__ai_player.stop_pondering()
                         self.__player_move_valid = True
                         self.__checkers.make_move(player_move)
 
@@ -215,6 +252,13 @@ class RobotCheckers(object):
             
             self.__play = False
             self.__checkers = None
+            self.__close_ai_player()
+
+    def __close_ai_player(self):
+        # worker processes and shared transposition table of player are
+        # freed, closing is repeated safely
+        if self.__ai_player is not None:
+            self.__ai_player.close()
 
     def __get_player_move(self):
         timer = None
@@ -237,7 +281,13 @@ class RobotCheckers(object):
         if board_code is None:
             return None
 
-        return self.__checkers.calc_move_between_boards(board_code)
+        # queen can take the same figures by different chains, all of them
+        # give the same position, so any of them is taken
+        moves = self.__checkers.calc_moves_between_boards(board_code)
+        if len(moves) == 0:
+            return None
+
+        return moves[0]
 
     def __make_move(self, move, promoted):
         board_pos = None
@@ -1,14 +1,35 @@
 import sys
+import os
 
 sys.path.append('..')
 sys.path.append('../src/robot/ai')
 sys.path.append('../src/robot/game_logic')
 
 import random
+import tempfile
 import unittest
+import multiprocessing
+import time
+from time import perf_counter
+from multiprocessing import shared_memory
 
-from src.robot.game_logic.checkers import Checkers
-from src.robot.ai.ai_player import AIPlayerRandom
+import numpy as np
+
+from src.robot.game_logic.checkers import Checkers, Move
+from src.robot.game_logic.batch import calc_available_moves_batch
+import src.robot.game_logic.serialization as serialization
+from src.robot.ai.ai_player import AIPlayerRandom, AIPlayerAlphaBeta, AIPlayerMonteCarlo
+from src.robot.ai.transposition_table import TranspositionTable, ENTRY_DTYPE
+from src.robot.ai.move_ordering import MoveOrdering
+from src.robot.ai.parallel_alphabeta import ParallelAlphaBeta
+from src.robot.ai.quiescence import QuiescenceSearch
+import src.robot.ai.evaluation as evaluation
+from src.robot.ai.opening_book import OpeningBook, build_book
+import src.robot.ai.alphabeta as alphabeta
+import src.robot.ai.monte_carlo as monte_carlo
+import src.robot.ai.batch_playout as batch_playout
+import src.robot.ai.endgame_tablebase as endgame_tablebase
+import src.robot.game_logic.bitboard as bb
 
 class BoardTest(unittest.TestCase):
     def test_calc_move_between_boards(self):
@@ -39,5 +60,689 @@ class BoardTest(unittest.TestCase):
 
             self.assertEqual(move, calc_move)
 
+    def test_bitboard_available_moves(self):
+        def moves_set(moves):
+            return set((tuple(map(tuple, move.chain)), frozenset(move.taken_figures)) for move in moves)
+
+        for _ in range(50):
+            robot_color = random.randint(0, 1)
+            checkers = Checkers(robot_color)
+            bitboard_checkers = Checkers(robot_color, bitboard=True)
+
+            while not checkers.end:
+                moves = checkers.calc_available_moves_for_player(checkers.player_turn)
+                bitboard_moves = bitboard_checkers.calc_available_moves_for_player(bitboard_checkers.player_turn)
+
+                self.assertEqual(moves_set(moves), moves_set(bitboard_moves))
+
+                move = random.choice(moves)
+                checkers.make_move(move)
+                bitboard_checkers.make_move(move)
+
+                self.assertTrue((checkers.board == bitboard_checkers.board).all())
+                self.assertEqual(checkers.end, bitboard_checkers.end)
+                self.assertEqual(checkers.winner, bitboard_checkers.winner)
+
+    def test_bitboard_calc_move_between_boards(self):
+        for _ in range(100):
+            checkers = Checkers(bitboard=True)
+
+            player = AIPlayerRandom(0)
+            opponent = AIPlayerRandom(1)
+
+            for _ in range(random.randint(0, 16)):
+                if checkers.player_turn == player.num:
+                    _ = player.make_move(checkers)
+                else:
+                    _ = opponent.make_move(checkers)
+
+            new_checkers = checkers.copy()
+
+            if new_checkers.player_turn == player.num:
+                move, _, _ = player.make_move(new_checkers)
+            else:
+                move, _, _ = opponent.make_move(new_checkers)
+
+            calc_move = checkers.calc_move_between_boards(new_checkers.board)
+
+            self.assertEqual(move, calc_move)
+
+    def test_push_pop(self):
+        def state(checkers):
+            return (checkers.board.tobytes(), checkers.player_turn, checkers.turn_counter,
+                    checkers.queens_moves_to_draw, checkers.end, checkers.winner, len(checkers.all_moves))
+
+        for bitboard in (False, True):
+            for _ in range(20):
+                checkers = Checkers(random.randint(0, 1), bitboard=bitboard)
+                states = []
+
+                while not checkers.end:
+                    moves = checkers.calc_available_moves_for_player(checkers.player_turn)
+                    states.append((state(checkers), moves))
+                    checkers.push(random.choice(moves))
+
+                copy = checkers.copy()
+                self.assertEqual(state(copy), state(checkers))
+
+                while states:
+                    checkers.pop()
+                    position_state, moves = states.pop()
+                    self.assertEqual(state(checkers), position_state)
+                    self.assertIs(checkers.available_moves, moves)
+
+    def test_keys(self):
+        def flip(board):
+            board = np.rot90(board, 2).copy()
+            flipped = board.copy()
+            flipped[board == 1] = 3
+            flipped[board == 2] = 4
+            flipped[board == 3] = 1
+            flipped[board == 4] = 2
+            return flipped
+
+        for _ in range(20):
+            robot_color = random.randint(0, 1)
+            checkers = Checkers(robot_color, bitboard=True)
+            keys = set()
+
+            while not checkers.end:
+                fresh = Checkers(robot_color, checkers.board, checkers.player_turn)
+                flipped = Checkers(robot_color, flip(checkers.board), 1 - checkers.player_turn)
+
+                self.assertEqual(checkers.key, fresh.key)
+                self.assertEqual(checkers.canonical_key, flipped.canonical_key)
+                self.assertEqual(checkers.copy().key, checkers.key)
+
+                keys.add(checkers.key)
+                checkers.push(random.choice(checkers.available_moves))
+
+            while checkers.all_moves:
+                checkers.pop()
+                self.assertIn(checkers.key, keys)
+
+    def test_batch_available_moves(self):
+        def moves_set(moves):
+            return set((tuple(map(tuple, move.chain)), frozenset(move.taken_figures)) for move in moves)
+
+        for robot_color in (0, 1):
+            boards = []
+            turns = []
+            expected_moves = []
+
+            for _ in range(20):
+                checkers = Checkers(robot_color, bitboard=True)
+                while not checkers.end:
+                    boards.append(checkers.board)
+                    turns.append(checkers.player_turn)
+                    expected_moves.append(checkers.available_moves)
+                    checkers.push(random.choice(checkers.available_moves))
+
+            batch_moves = calc_available_moves_batch(np.array(boards), np.array(turns), robot_color)
+
+            self.assertEqual(len(batch_moves), len(expected_moves))
+            for moves, expected in zip(batch_moves, expected_moves):
+                self.assertEqual(moves_set(moves), moves_set(expected))
+
+    def test_is_move_valid(self):
+        for _ in range(20):
+            checkers = Checkers(random.randint(0, 1), bitboard=True)
+
+            while not checkers.end:
+                moves = checkers.available_moves
+                for move in moves:
+                    self.assertTrue(checkers.is_move_valid(Move(list(move.chain), list(move.taken_figures)[::-1])))
+
+                for move in checkers.calc_available_moves_for_player(checkers.opponent()):
+                    self.assertFalse(checkers.is_move_valid(move))
+
+                if len(moves[0].taken_figures) > 0:
+                    self.assertFalse(checkers.is_move_valid(Move(moves[0].chain[:2], [])))
+
+                checkers.push(random.choice(moves))
+
+    def test_move_encoding(self):
+        for _ in range(20):
+            checkers = Checkers(random.randint(0, 1), bitboard=True)
+
+            while not checkers.end:
+                for move in checkers.available_moves:
+                    decoded = Move(move.chain, move.taken_figures, move.promoted)
+
+                    self.assertEqual(move, decoded)
+                    self.assertEqual(hash(move), hash(decoded))
+                    self.assertEqual(move.src, move.chain[0])
+                    self.assertEqual(move.dest, move.chain[-1])
+                    self.assertEqual(len(move.taken_figures), bin(move.taken_mask).count('1'))
+
+                checkers.push(random.choice(checkers.available_moves))
+
+    def test_calc_moves_between_boards(self):
+        for bitboard in (False, True):
+            for _ in range(20):
+                checkers = Checkers(random.randint(0, 1), bitboard=bitboard)
+
+                while not checkers.end:
+                    for move in checkers.available_moves:
+                        new_checkers = checkers.copy()
+                        new_checkers.push(move)
+
+                        self.assertIn(move, checkers.calc_moves_between_boards(new_checkers.board))
+
+                    self.assertEqual(checkers.calc_moves_between_boards(checkers.board), [])
+
+                    checkers.push(random.choice(checkers.available_moves))
+
+    def test_serialization(self):
+        boards = []
+        turns = []
+        for _ in range(20):
+            checkers = Checkers(random.randint(0, 1))
+
+            while not checkers.end:
+                decoded = Checkers.from_bytes(checkers.to_bytes())
+
+                self.assertTrue((decoded.board == checkers.board).all())
+                self.assertEqual(decoded.player_turn, checkers.player_turn)
+                self.assertEqual(decoded.turn_counter, checkers.turn_counter)
+                self.assertEqual(decoded.queens_moves_to_draw, checkers.queens_moves_to_draw)
+                self.assertEqual(decoded.key, checkers.key)
+
+                boards.append(checkers.board)
+                turns.append(checkers.player_turn)
+                checkers.push(random.choice(checkers.available_moves))
+
+            replayed = Checkers.from_game_record(checkers.game_record())
+
+            self.assertEqual(replayed.all_moves, checkers.all_moves)
+            self.assertTrue((replayed.board == checkers.board).all())
+            self.assertEqual(replayed.winner, checkers.winner)
+
+            # game started from decoded position keeps its counters
+            started = Checkers.from_bytes(decoded.to_bytes())
+            started.push(checkers.all_moves[-1])
+            replayed = Checkers.from_game_record(started.game_record())
+
+            self.assertEqual(replayed.turn_counter, started.turn_counter)
+            self.assertEqual(replayed.queens_moves_to_draw, started.queens_moves_to_draw)
+            self.assertEqual(replayed.end, started.end)
+            self.assertEqual(replayed.winner, started.winner)
+
+        positions = serialization.decode_positions(serialization.encode_positions(boards, turns, 0))
+
+        self.assertTrue((positions['boards'] == np.array(boards)).all())
+        self.assertTrue((positions['turns'] == turns).all())
+        self.assertRaises(ValueError, Checkers.from_bytes, checkers.game_record())
+
+    def test_transposition_table(self):
+        # results of table kept between moves are the same as of fresh one
+        table = TranspositionTable(1)
+        checkers = Checkers(bitboard=True)
+
+        for _ in range(30):
+            if checkers.end:
+                break
+            fresh_table = TranspositionTable(1)
+            move = alphabeta.get_best_move(checkers, 3, table)
+            alphabeta.get_best_move(checkers, 3, fresh_table)
+
+            self.assertIn(move, checkers.available_moves)
+            self.assertEqual(table.probe(checkers.key)[:3], fresh_table.probe(checkers.key)[:3])
+            self.assertEqual(alphabeta.principal_variation(checkers, table)[0], move)
+
+            checkers.push(random.choice(checkers.available_moves))
+
+        self.assertLessEqual(table.memory, 2**20)
+
+        # scores come back exactly, tablebase scores differ only in distance
+        for key, score in enumerate((endgame_tablebase.score(endgame_tablebase.WIN, 7),
+                                     endgame_tablebase.score(endgame_tablebase.LOSS, 8), 0.35), 1):
+            table.store(key, 2, 0, score, 300)
+            self.assertEqual(table.probe(key), (2, 0, score, 300))
+        self.assertNotEqual(table.probe(1)[2], endgame_tablebase.score(endgame_tablebase.WIN, 6))
+
+    def test_iterative_deepening(self):
+        table = TranspositionTable(1)
+        checkers = Checkers(bitboard=True)
+
+        for _ in range(10):
+            # depth is not limited, so only time budget ends search, bound is
+            # generous for slow machines
+            time_0 = perf_counter()
+            move = alphabeta.get_best_move(checkers, None, table, 0.05)
+
+            self.assertLess(perf_counter() - time_0, 2)
+            self.assertIn(move, checkers.available_moves)
+
+            checkers.push(move)
+
+    def test_move_ordering(self):
+        ordering = MoveOrdering()
+        checkers = Checkers(bitboard=True)
+
+        for _ in range(10):
+            moves = checkers.available_moves
+            order = ordering.order(moves, len(moves) - 1, checkers.player_turn, checkers.turn_counter)
+
+            self.assertEqual(sorted(order), list(range(len(moves))))
+            self.assertEqual(order[0], len(moves) - 1)
+            taken = [len(moves[i].taken_figures) for i in order[1:]]
+            self.assertEqual(taken, sorted(taken, reverse=True))
+
+            checkers.push(alphabeta.get_best_move(checkers, 4, ordering=ordering))
+
+        self.assertGreater(ordering.cutoffs, 0)
+        self.assertLessEqual(ordering.first_move_cutoff_rate, 1)
+
+    def test_shared_transposition_table(self):
+        table = TranspositionTable(1, shared=True)
+        attached = TranspositionTable(name=table.name)
+
+        table.store(12345, 3, 1, -2.5, 7)
+        self.assertEqual(attached.probe(12345), (3, 1, -2.5, 7))
+        self.assertIsNone(attached.probe(12345 + attached.size))
+
+        # torn entry, data of other store with old check
+        memory = shared_memory.SharedMemory(table.name)
+        entries = np.ndarray(attached.size, dtype=ENTRY_DTYPE, buffer=memory.buf)
+        entries['score'][12345 & (attached.size - 1)] ^= 1 << 40
+        self.assertIsNone(attached.probe(12345))
+
+        del entries
+        memory.close()
+        attached.close()
+        table.close(unlink=True)
+
+    def test_quiescence(self):
+        # player 0 has to take, position is quiet after that
+        board = np.zeros((8, 8), dtype=np.uint8)
+        board[1, 2] = 1
+        board[2, 3] = 3
+        board[6, 7] = 3
+        checkers = Checkers(0, board, 0)
+        quiescence = QuiescenceSearch()
+
+        quiet = checkers.copy()
+        quiet.push(quiet.available_moves[0])
+
+        self.assertEqual(quiescence.search(checkers, -1e10, 1e10, 0), evaluation.material(quiet, 0))
+        self.assertEqual(quiescence.nodes, 2)
+        self.assertTrue((checkers.board == board).all())
+
+    def test_incremental_evaluation(self):
+        for robot_color in (0, 1):
+            checkers = Checkers(robot_color, weights=evaluation.DEFAULT_WEIGHTS)
+
+            for _ in range(200):
+                if checkers.end:
+                    checkers.pop()
+                elif random.random() < 0.3 and checkers.turn_counter > 0:
+                    checkers.pop()
+                else:
+                    checkers.push(random.choice(checkers.available_moves))
+
+                fresh = Checkers(robot_color, checkers.board, checkers.player_turn, weights=evaluation.DEFAULT_WEIGHTS)
+                self.assertAlmostEqual(checkers.evaluation(0), fresh.evaluation(0))
+                self.assertAlmostEqual(checkers.evaluation(1), -fresh.evaluation(0))
+
+        # all weights equal to material
+        weights = evaluation.PieceSquareWeights(np.ones((8, 8)), np.full((8, 8), 4))
+        for _ in range(30):
+            if checkers.end:
+                break
+            checkers.push(random.choice(checkers.available_moves))
+        checkers.set_weights(weights)
+        self.assertEqual(checkers.evaluation(1), evaluation.material(checkers, 1))
+
+    def test_pondering(self):
+        player = AIPlayerAlphaBeta(1, 3, 1)
+        checkers = Checkers(bitboard=True)
+
+        player.start_pondering(checkers)
+        while player.pondering:
+            time.sleep(.01)
+        player.stop_pondering()
+
+        checkers.push(random.choice(checkers.available_moves))
+        pondered = player.pondered_moves[checkers.key]
+        move, ret, _ = player.make_move(checkers)
+
+        self.assertIs(move, pondered)
+        self.assertTrue(ret)
+
+        # stopped right away, search of depth 20 would not end by itself,
+        # bound is generous for slow machines
+        player = AIPlayerAlphaBeta(1, 20, 1)
+        player.start_pondering(checkers)
+        time_0 = perf_counter()
+        player.stop_pondering()
+        self.assertLess(perf_counter() - time_0, 2)
+        self.assertFalse(player.pondering)
+        self.assertLess(len(player.pondered_moves), len(checkers.available_moves))
+
+    def test_opening_book(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            positions = build_book(path, 2, 2)
+            book = OpeningBook(path)
+
+            for robot_color in (0, 1):
+                checkers = Checkers(robot_color, bitboard=True)
+                player = AIPlayerAlphaBeta(0, 2, 1, ponder=False, book=book)
+
+                for _ in range(2):
+                    codes = [code for code, _ in book.moves(checkers.key)]
+                    move, ret, _ = player.make_move(checkers)
+
+                    self.assertTrue(ret)
+                    self.assertIn(move.code, codes)
+
+            self.assertLessEqual(positions, 2*(1 + 7))
+            self.assertEqual(book.moves(12345), [])
+
+    def test_parallel_alphabeta(self):
+        # the same move as serial search with the same random state
+        parallel = ParallelAlphaBeta(2, None)
+        checkers = Checkers(bitboard=True)
+
+        for _ in range(10):
+            state = random.getstate()
+            move = alphabeta.get_best_move(checkers, 4)
+            random.setstate(state)
+
+            self.assertEqual(parallel.get_best_move(checkers, 4), move)
+
+            checkers.push(move)
+
+        parallel.close()
+
+    def test_ai_player_close(self):
+        # worker processes of players end with close, which can be repeated
+        checkers = Checkers(bitboard=True)
+        players = [AIPlayerAlphaBeta(0, 2, processes=2), AIPlayerMonteCarlo(1, 20, processes=2)]
+        for player in players:
+            player.make_move(checkers)
+        self.assertGreater(len(multiprocessing.active_children()), 0)
+
+        for player in players:
+            player.close()
+            player.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_parallel_alphabeta_shared_table(self):
+        parallel = ParallelAlphaBeta(2, 1)
+        table = TranspositionTable(name=parallel.table_name)
+        checkers = Checkers(bitboard=True)
+
+        for _ in range(4):
+            move = parallel.get_best_move(checkers, 4, 1)
+            self.assertTrue(checkers.is_move_valid(move))
+
+            # root moves were searched and stored by worker processes
+            for available_move in checkers.available_moves:
+                checkers.push(available_move)
+                self.assertIsNotNone(table.probe(checkers.key))
+                checkers.pop()
+
+            checkers.push(move)
+
+        table.close()
+        parallel.close()
+
+    def test_endgame_tablebase(self):
+        index = endgame_tablebase.TableIndex((1, 1, 1, 0))
+        self.assertEqual(sorted(index.index(*index.placement(i)) for i in range(index.size)),
+                         list(range(index.size)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            endgame_tablebase.generate(directory, 2, 2)
+            tablebase = endgame_tablebase.Tablebase(directory)
+
+            random.seed(0)
+            for _ in range(50):
+                # one figure of every player, results are checked by search
+                # of exactly distance plies
+                board = np.zeros((8, 8), dtype=np.uint8)
+                pos_1, pos_2 = random.sample(bb.SQUARE_POS[4:28], 2)
+                board[pos_1] = random.randint(1, 2)
+                board[pos_2] = random.randint(3, 4)
+                checkers = Checkers(random.randrange(2), board, random.randrange(2), bitboard=True)
+
+                result, distance = tablebase.probe(checkers)
+                if result == endgame_tablebase.DRAW or not 0 < distance <= 7:
+                    continue
+                player = checkers.player_turn
+                self.assertEqual(alphabeta.alphabeta(checkers, -1e11, 1e11, distance, player), 1e10*result)
+                if distance > 1:
+                    self.assertLess(abs(alphabeta.alphabeta(checkers, -1e11, 1e11, distance - 1, player)), 1e10)
+
+                # result is not exact when both players could reach 15 queen
+                # moves before the end, side of them that cannot keeps it
+                counters = [0, 0]
+                counters[player] = 16 - (distance + 1)//2
+                counters[1 - player] = 16 - distance//2
+                drawing = Checkers.from_bytes(serialization.encode_position(board, player, checkers.robot_color,
+                                                                            0, counters, False, None),
+                                              bitboard=True)
+                self.assertIsNone(tablebase.probe(drawing))
+                self.assertIsNone(tablebase.best_move(drawing))
+                counters[random.randrange(2)] -= 1
+                winning = Checkers.from_bytes(serialization.encode_position(board, player, checkers.robot_color,
+                                                                            0, counters, False, None),
+                                              bitboard=True)
+                self.assertEqual(tablebase.probe(winning), (result, distance))
+
+                move = tablebase.best_move(checkers)
+                checkers.push(move)
+                if not checkers.end:
+                    self.assertEqual(tablebase.probe(checkers), (-result, distance - 1))
+
+    def test_monte_carlo_tree_search(self):
+        random.seed(0)
+        search = monte_carlo.MonteCarloTreeSearch(200)
+        checkers = Checkers(bitboard=True)
+
+        reused = 0
+        for _ in range(5):
+            move = search.get_best_move(checkers)
+            self.assertTrue(checkers.is_move_valid(move))
+            self.assertGreaterEqual(search.root_visits, 200)
+            reused += search.root_visits - 200
+
+            # subtree of opponent answer is kept
+            checkers.push(move)
+            checkers.push(random.choice(checkers.available_moves))
+
+        self.assertGreater(reused, 0)
+
+    def test_rollout_pool(self):
+        checkers = Checkers(bitboard=True)
+        jobs = [([], 20), ([checkers.available_moves[0].code], 3)]
+
+        # the same seed gives the same results
+        results = []
+        for _ in range(2):
+            pool = monte_carlo.RolloutPool(2, seed=1)
+            results.append(pool.rollouts(checkers, jobs))
+            pool.close()
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([sum(counts) for counts in results[0]], [20, 3])
+
+        pool = monte_carlo.RolloutPool(2, seed=1)
+        search = monte_carlo.MonteCarloTreeSearch(50, pool=pool)
+        self.assertTrue(checkers.is_move_valid(search.get_best_move(checkers)))
+        self.assertEqual(search.root_visits, 50)
+        pool.close()
+
+    def test_playout(self):
+        for robot_color in (0, 1):
+            checkers = Checkers(robot_color)
+            checkers_bitboard = Checkers(robot_color, bitboard=True)
+            for _ in range(10):
+                move = random.choice(checkers.available_moves)
+                checkers.push(move)
+                checkers_bitboard.push(move)
+
+            # game is played on bitboards of both backends
+            results = []
+            for position in (checkers, checkers_bitboard):
+                results.append([monte_carlo.playout(position, random.Random(seed)) for seed in range(20)])
+                self.assertTrue(all(result in (-1, 0, 1) for result in results[-1]))
+            self.assertEqual(results[0], results[1])
+
+        while not checkers.end:
+            checkers.push(random.choice(checkers.available_moves))
+        self.assertEqual(monte_carlo.playout(checkers), checkers.winner)
+
+    def test_playout_moves(self):
+        # bitboards of playout are recorded at every random number, that is
+        # once per ply, and every change of them is replayed by legal move
+        class TracedPosition(object):
+            def __init__(self, checkers):
+                self.checkers = checkers
+                self.pawns, self.queens = checkers.bitboards()
+                self.end = checkers.end
+                self.winner = checkers.winner
+                self.player_turn = checkers.player_turn
+                self.robot_color = checkers.robot_color
+                self.queens_moves_to_draw = checkers.queens_moves_to_draw
+
+            def bitboards(self):
+                return self.pawns, self.queens
+
+        class TracedRandom(random.Random):
+            def __init__(self, seed, position):
+                super().__init__(seed)
+                self.position = position
+                self.trace = []
+
+            def random(self):
+                self.trace.append((tuple(self.position.pawns), tuple(self.position.queens)))
+                return super().random()
+
+        def bitboards(checkers):
+            return tuple(map(tuple, checkers.bitboards()))
+
+        def moves_to(checkers, condition):
+            # available moves after which condition of position holds
+            moves = []
+            for move in checkers.available_moves:
+                checkers.push(move)
+                if condition(checkers):
+                    moves.append(move)
+                checkers.pop()
+            return moves
+
+        for seed in range(40):
+            random.seed(seed)
+            checkers = Checkers(seed % 2, bitboard=True)
+            for _ in range(random.randint(0, 20)):
+                checkers.push(random.choice(checkers.available_moves))
+            if checkers.end:
+                continue
+
+            position = TracedPosition(checkers.copy())
+            rng = TracedRandom(seed, position)
+            result = monte_carlo.playout(position, rng)
+
+            self.assertEqual(rng.trace[0], bitboards(checkers))
+            for trace in rng.trace[1:]:
+                # queen can take the same figures by different chains
+                moves = moves_to(checkers, lambda child: bitboards(child) == trace)
+                self.assertGreater(len(moves), 0)
+                checkers.push(moves[0])
+
+            # game drawn by queen moves ends without next random number
+            if not checkers.end:
+                moves = moves_to(checkers, lambda child: child.end and child.winner == -1)
+                self.assertGreater(len(moves), 0)
+                checkers.push(moves[0])
+            self.assertEqual(result, checkers.winner)
+
+    def test_batch_playout(self):
+        rng = np.random.default_rng(0)
+        checkers = Checkers(1, bitboard=True)
+        for _ in range(6):
+            checkers.push(random.choice(checkers.available_moves))
+
+        counts = batch_playout.root_move_counts(checkers, 50, rng)
+        self.assertEqual(len(counts), len(checkers.available_moves))
+        self.assertTrue(all(sum(move_counts) == 50 for move_counts in counts))
+
+        # player without figures loses
+        pawns = np.array([[0, 0], [1 << 28, 1 << 29]], dtype=np.uint64)
+        queens = np.zeros((2, 2), dtype=np.uint64)
+        results = batch_playout.playouts(pawns, queens, 0, 0, np.zeros((2, 2)), rng)
+        self.assertEqual(results.tolist(), [1, 1])
+
+        player = AIPlayerMonteCarlo(checkers.player_turn, 20, seed=0, batch=True)
+        move, _, _ = player.make_move(checkers.copy())
+        self.assertTrue(checkers.is_move_valid(move))
+
+    def test_batch_playout_moves(self):
+        # every ply of batched games is replayed by legal move, games start
+        # in positions of random games where both players have queens, half
+        # of them close to draw, so they have queen chains, promotions and
+        # draws by queen moves
+        def bitboards(checkers):
+            return tuple(map(tuple, checkers.bitboards()))
+
+        def moves_to(checkers, position):
+            moves = []
+            for move in checkers.available_moves:
+                checkers.push(move)
+                if bitboards(checkers) == position:
+                    moves.append(move)
+                checkers.pop()
+            return moves
+
+        random.seed(0)
+        games = []
+        while len(games) < 40:
+            checkers = Checkers(0, bitboard=True)
+            while not checkers.end and (checkers.player_turn != 0 or not all(checkers.bitboards()[1])):
+                checkers.push(random.choice(checkers.available_moves))
+            if not checkers.end:
+                if len(games) % 2 == 1:
+                    position = serialization.encode_position(checkers.board, 0, 0, 0, [15, 15], False, None)
+                    checkers = Checkers.from_bytes(position, bitboard=True)
+                games.append(checkers)
+
+        pawns, queens = (np.array(arrays, dtype=np.uint64).T
+                         for arrays in zip(*(checkers.bitboards() for checkers in games)))
+        counters = np.array([[15 - moves for moves in checkers.queens_moves_to_draw] for checkers in games],
+                            dtype=np.int64).T
+        rng = np.random.default_rng(0)
+        player = 0
+        chains = promotions = draws = 0
+        while len(games) > 0:
+            lost, drawn = batch_playout.ply(pawns, queens, counters, player, 0, rng)
+            for i, checkers in enumerate(games):
+                if lost[i]:
+                    self.assertTrue(checkers.end)
+                    self.assertEqual(checkers.winner, 1 - player)
+                    continue
+
+                # queen can take the same figures by different chains
+                position = (tuple(map(int, pawns[:, i])), tuple(map(int, queens[:, i])))
+                moves = moves_to(checkers, position)
+                self.assertGreater(len(moves), 0)
+                chains += len(moves[0].chain) > 2
+                promotions += checkers.push(moves[0])
+                self.assertEqual([15 - moves for moves in checkers.queens_moves_to_draw], counters[:, i].tolist())
+                self.assertEqual(drawn[i], checkers.end and checkers.winner == -1)
+                draws += int(drawn[i])
+
+            running = ~(lost | drawn)
+            games = [checkers for checkers, game_running in zip(games, running) if game_running]
+            pawns = pawns[:, running]
+            queens = queens[:, running]
+            counters = counters[:, running]
+            player = 1 - player
+
+        self.assertGreater(chains, 0)
+        self.assertGreater(promotions, 0)
+        self.assertGreater(draws, 0)
+
 if __name__ == '__main__':
     unittest.main()